@@ -0,0 +1,128 @@
+'''
+Load/dump throughput of the charges_calc JSON backends
+
+    python benchmark_json.py --scale 100 -o bench_json.json
+
+source.json is calculated once and copied scale times under fresh RNT ids,
+then every available backend is timed loading the input and dumping the
+output in the default, compact and ndjson layouts. The report is JSON, one
+record per backend and layout.
+'''
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+import charges_calc
+
+DIR_PATH = os.path.dirname(os.path.realpath(__file__))
+SOURCE = os.path.join(DIR_PATH, 'source.json')
+LAYOUTS = {'default': {}, 'compact': {'compact': True}, 'ndjson': {'ndjson': True}}
+
+
+def scale_rentals(data, scale):
+    '''
+    scale copies of the rentals that calculate without errors, with new ids
+    '''
+    rentals = {}
+    for rental_id, value in data.items():
+        try:
+            charges_calc.calculate_rental(dict(value))
+        except (ValueError, ZeroDivisionError):
+            continue
+        rentals[rental_id] = value
+    return {'%s_%d' % (rental_id, copy): dict(value)
+            for copy in range(scale) for rental_id, value in rentals.items()}
+
+
+def available_backends():
+    '''
+    Named JSON backends importable here
+    '''
+    names = []
+    for name in charges_calc.JSON_BACKENDS[1:]:
+        try:
+            charges_calc.json_backend(name)
+        except ValueError:
+            continue
+        names.append(name)
+    return names
+
+
+def best_time(func, *args, repeat=3, **kwargs):
+    '''
+    (fastest wall time in seconds, last result) of repeat calls
+    '''
+    best = float('inf')
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func(*args, **kwargs)
+        best = min(best, time.perf_counter() - started)
+    return best, result
+
+
+def bench_backends(scale, repeat=3, backends=None):
+    '''
+    One record per backend and layout: load and dump seconds, output bytes
+    and records per second
+    '''
+    with open(SOURCE) as file:
+        rentals = scale_rentals(json.load(file), scale)
+
+    report = []
+    with tempfile.TemporaryDirectory() as folder:
+        source = os.path.join(folder, 'source.json')
+        with open(source, 'w') as file:
+            json.dump(rentals, file)
+        data = charges_calc.calculate_additional_fields(rentals)
+        output = os.path.join(folder, 'out.json')
+
+        for backend in backends or available_backends():
+            load, _ = best_time(charges_calc.load_rentals_file, source, backend,
+                                repeat=repeat)
+            for layout, options in LAYOUTS.items():
+                if layout == 'default' and backend != 'json':
+                    continue
+                dump, _ = best_time(charges_calc.save_to_json, output, data,
+                                    backend=backend, repeat=repeat, **options)
+                report.append({'backend': backend, 'layout': layout, 'records': len(data),
+                               'bytes': os.path.getsize(output),
+                               'seconds': {'load': load, 'dump': dump},
+                               'records_per_second': {'load': len(data) / load,
+                                                      'dump': len(data) / dump}})
+    return report
+
+
+def parse_cmd_arguments(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the charges_calc JSON backends.')
+    parser.add_argument('--scale', type=int, default=100,
+                        help='copies of source.json to time')
+    parser.add_argument('--repeat', type=int, default=3, help='runs per timing, best is kept')
+    parser.add_argument('--backend', action='append', choices=charges_calc.JSON_BACKENDS[1:],
+                        help='backend to time, all available ones by default')
+    parser.add_argument('-o', '--output', help='write the JSON report here instead of stdout')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_cmd_arguments(argv)
+    try:
+        report = bench_backends(args.scale, args.repeat, args.backend)
+    except ValueError as error:
+        sys.stderr.write('%s\n' % error)
+        return 1
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as output:
+            output.write(text + '\n')
+    else:
+        print(text)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,47 +1,925 @@
 '''
-Returns total price paid for individual rentals 
+Returns total price paid for individual rentals
 '''
 import argparse
 import json
 import datetime
+import hashlib
+import io
+import logging
+import logging.handlers
 import math
+import operator
+import os
+import re
+import time
+from functools import lru_cache, partial
+from itertools import accumulate
+from multiprocessing import Pool
+from queue import Queue
+
+from columnar import write_columns
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+CHUNK_SIZE = 1 << 16
+DATE_CACHE_SIZE = 4096
+CHECKPOINT_EVERY = 10000
+DERIVED_FIELDS = ('total_days', 'total_price', 'sqrt_total_price', 'unit_cost')
+INDEX_SUFFIX = '.index'
+JSON_BACKENDS = ('auto', 'json', 'orjson')
+LOG_FORMAT = '%(asctime)s %(filename)s:%(lineno)-3d %(levelname)s %(message)s'
+LOG_LEVELS = {0: None, 1: logging.ERROR, 2: logging.WARNING, 3: logging.DEBUG}
+
+logger = logging.getLogger('charges_calc')
+logger.addHandler(logging.NullHandler())
+_listener = None
+
 
 def parse_cmd_arguments():
     parser = argparse.ArgumentParser(description='Process some integers.')
     parser.add_argument('-i', '--input', help='input JSON file', required=True)
     parser.add_argument('-o', '--output', help='ouput JSON file', required=True)
+    parser.add_argument('-s', '--stream', action='store_true',
+                        help='parse, calculate and write one rental at a time')
+    parser.add_argument('-b', '--batch', action='store_true',
+                        help='calculate all rentals column by column')
+    parser.add_argument('-w', '--workers', type=int, default=0,
+                        help='calculate shards of the rentals in N processes')
+    parser.add_argument('-r', '--rejects',
+                        help='write rentals that fail to this JSON lines file and carry on')
+    parser.add_argument('-c', '--checkpoint',
+                        help='with --stream, record progress here and resume from it')
+    parser.add_argument('-n', '--incremental', action='store_true',
+                        help='only recalculate rentals changed since the last run')
+    parser.add_argument('-j', '--json', choices=JSON_BACKENDS, default='auto',
+                        help='JSON library for reading and compact writing')
+    parser.add_argument('--compact', action='store_true',
+                        help='write the output without whitespace')
+    parser.add_argument('--ndjson', action='store_true',
+                        help='write one rental per line, its id under rental_id')
+    parser.add_argument('-a', '--summary',
+                        help='write totals per product_code and rental_start month here')
+    parser.add_argument('--columns',
+                        help='also write the results to this typed columnar file')
+    parser.add_argument('-d', '--debug', type=int, choices=sorted(LOG_LEVELS), default=0,
+                        help='0 no logging, 1 errors, 2 warnings, 3 every rental')
+    parser.add_argument('-l', '--log-file',
+                        help='log file, charges_calc_YYYY-MM-DD.log by default')
+
+    args = parser.parse_args()
+    if args.checkpoint and not args.stream:
+        parser.error('--checkpoint needs --stream')
+    if args.incremental and args.stream:
+        parser.error('--incremental does not work with --stream')
+    if args.rejects and args.batch and not args.workers:
+        parser.error('--rejects does not work with --batch')
+    if (args.compact or args.ndjson) and (args.stream or args.incremental):
+        parser.error('--compact and --ndjson do not work with --stream or --incremental')
+    if args.summary and args.incremental:
+        parser.error('--summary does not work with --incremental')
+    if args.columns and (args.stream or args.incremental):
+        parser.error('--columns does not work with --stream or --incremental')
+    try:
+        json_backend(args.json)
+    except ValueError as error:
+        parser.error(str(error))
+    return args
+
+
+def setup_logging(debug, log_file=None):
+    '''
+    Configure logging once for the run. Records go through a queue to a
+    listener thread that does the console and file I/O, so the calculation
+    only pays for putting them on the queue; at level 0 nothing is logged.
+    Calling it again replaces the previous setup
+    '''
+    global _listener
+    stop_logging()
+    level = LOG_LEVELS[debug]
+    if level is None:
+        logger.setLevel(logging.CRITICAL + 1)
+        return
+
+    if log_file is None:
+        log_file = 'charges_calc_%s.log' % datetime.date.today().isoformat()
+    formatter = logging.Formatter(LOG_FORMAT)
+    file_handler = logging.FileHandler(log_file)
+    file_handler.setFormatter(formatter)
+    console_handler = logging.StreamHandler()
+    console_handler.setFormatter(formatter)
+    # Per-rental debug messages go to the file only
+    console_handler.setLevel(max(level, logging.INFO))
+
+    records = Queue()
+    _listener = logging.handlers.QueueListener(records, file_handler, console_handler,
+                                               respect_handler_level=True)
+    logger.handlers = [logging.handlers.QueueHandler(records)]
+    logger.setLevel(level)
+    logger.propagate = False
+    _listener.start()
+
+
+def stop_logging():
+    '''
+    Flush the queued records and close the log handlers
+    '''
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
+    logger.handlers = [logging.NullHandler()]
+
 
-    return parser.parse_args()
+def json_backend(name='auto'):
+    '''
+    (loads, dumps) of a JSON library: loads takes bytes, dumps returns
+    compact UTF-8 bytes. auto is orjson when it is installed, otherwise
+    the standard library
+    '''
+    if name == 'auto':
+        name = 'json' if orjson is None else 'orjson'
+    if name == 'orjson':
+        if orjson is None:
+            raise ValueError('orjson is not installed')
+        return orjson.loads, orjson.dumps
+    if name != 'json':
+        raise ValueError('unknown JSON backend %r' % name)
+    return json.loads, lambda value: json.dumps(value, separators=(',', ':')).encode()
 
 
-def load_rentals_file(filename):
-    with open(filename) as file:
+def load_rentals_file(filename, backend='auto'):
+    loads, _ = json_backend(backend)
+    with open(filename, 'rb') as file:
         try:
-            data = json.load(file)
+            data = loads(file.read())
         except:
+            logger.error('%s is not a JSON file of rentals', filename)
             exit(0)
     return data
 
-def calculate_additional_fields(data):
-    for value in data.values():
+
+def parse_date_ordinal(text):
+    '''
+    Proleptic ordinal of an m/d/y date string, as strptime(text, '%m/%d/%y')
+    would read it. Plain ASCII digit fields take a fast path; anything else goes
+    to strptime so odd input is accepted or rejected exactly as before
+    '''
+    parts = text.split('/')
+    if len(parts) == 3:
+        month, day, year = parts
+        if (len(month) <= 2 and len(day) <= 2 and len(year) == 2 and text.isascii()
+                and month.isdigit() and day.isdigit() and year.isdigit()):
+            year = int(year)
+            year += 2000 if year < 69 else 1900
+            return datetime.date(year, int(month), int(day)).toordinal()
+    return datetime.datetime.strptime(text, '%m/%d/%y').toordinal()
+
+
+# Rental exports reuse a small set of dates, so most lookups are cache hits
+parse_date = lru_cache(maxsize=DATE_CACHE_SIZE)(parse_date_ordinal)
+
+
+def date_cache_info():
+    '''
+    Hits, misses, maxsize and current size of the date string cache
+    '''
+    return parse_date.cache_info()
+
+
+def calculate_rental(value):
+    '''
+    Add total_days, total_price, sqrt_total_price and unit_cost to one rental
+    '''
+    value['total_days'] = parse_date(value['rental_end']) - parse_date(value['rental_start'])
+    value['total_price'] = value['total_days'] * value['price_per_day']
+    value['sqrt_total_price'] = math.sqrt(value['total_price'])
+    value['unit_cost'] = value['total_price'] / value['units_rented']
+    return value
+
+
+@lru_cache(maxsize=DATE_CACHE_SIZE)
+def rental_month(text):
+    '''
+    YYYY-MM month of an m/d/y date string
+    '''
+    return datetime.date.fromordinal(parse_date(text)).strftime('%Y-%m')
+
+
+class RentalSummary:
+    '''
+    Running totals of calculated rentals per product_code and per
+    rental_start month, filled in as the rentals are calculated so the
+    output never has to be read back
+    '''
+    GROUPS = ('product_code', 'month')
+
+    def __init__(self, state=None):
+        # group -> key -> [rentals, units_rented, total_price, sum of unit_cost]
+        self.totals = state or {group: {} for group in self.GROUPS}
+
+    def add(self, value):
+        '''
+        Count one calculated rental
+        '''
+        for group, key in (('product_code', value['product_code']),
+                           ('month', rental_month(value['rental_start']))):
+            totals = self.totals[group].get(key)
+            if totals is None:
+                totals = self.totals[group][key] = [0, 0, 0, 0.0]
+            totals[0] += 1
+            totals[1] += value['units_rented']
+            totals[2] += value['total_price']
+            totals[3] += value['unit_cost']
+
+    def update(self, values):
+        '''
+        Count every calculated rental in values
+        '''
+        for value in values:
+            self.add(value)
+
+    def state(self):
+        '''
+        The running totals as plain JSON data, to restore with RentalSummary(state)
+        '''
+        return self.totals
+
+    def report(self):
+        '''
+        Rentals, units_rented, total_price and average_unit_cost of every
+        group, keys sorted
+        '''
+        return {group: {key: {'rentals': rentals, 'units_rented': units,
+                              'total_price': total_price,
+                              'average_unit_cost': unit_cost / rentals}
+                        for key, (rentals, units, total_price, unit_cost)
+                        in sorted(self.totals[group].items())}
+                for group in self.GROUPS}
+
+    def save(self, filename):
+        with open(filename, 'w') as file:
+            json.dump(self.report(), file, indent=2)
+
+
+def reject_reason(value, error):
+    '''
+    Why a rental could not be calculated, in words
+    '''
+    if isinstance(error, ZeroDivisionError):
+        return 'units_rented is 0'
+    if isinstance(error, ValueError) and value.get('total_days', 0) < 0:
+        return 'rental_end is before rental_start'
+    if isinstance(error, ValueError) and value.get('total_price', 0) < 0:
+        return 'price_per_day %r is negative' % value.get('price_per_day')
+    if isinstance(error, ValueError):
+        return 'bad rental dates %r - %r: %s' % (value.get('rental_start'),
+                                                 value.get('rental_end'), error)
+    return '%s: %s' % (type(error).__name__, error)
+
+
+def write_reject(rejects, rental_id, value, reason):
+    '''
+    Quarantine one rental, as it was read, to the rejects file
+    '''
+    logger.warning('%s rejected: %s', rental_id, reason)
+    rental = {key: field for key, field in value.items() if key not in DERIVED_FIELDS}
+    rejects.write(json.dumps({'rental_id': rental_id, 'reason': reason,
+                              'rental': rental}) + '\n')
+
+
+def calculate_additional_fields(data, rejects=None, summary=None):
+    '''
+    Calculate every rental. Without rejects the first bad rental ends the
+    run; with a rejects file it is written there, dropped from data, and
+    the rest carry on. Calculated rentals are added to summary if given
+    '''
+    debug = logger.isEnabledFor(logging.DEBUG)
+    for rental_id, value in list(data.items()):
         try:
-            rental_start = datetime.datetime.strptime(value['rental_start'], '%m/%d/%y')
-            rental_end = datetime.datetime.strptime(value['rental_end'], '%m/%d/%y')
-            value['total_days'] = (rental_end - rental_start).days
-            value['total_price'] = value['total_days'] * value['price_per_day']
-            value['sqrt_total_price'] = math.sqrt(value['total_price'])
-            value['unit_cost'] = value['total_price'] / value['units_rented']
-        except:
-            exit(0)
+            calculate_rental(value)
+        except Exception as error:
+            if rejects is None:
+                logger.error('%s: %s', rental_id, reject_reason(value, error))
+                exit(0)
+            write_reject(rejects, rental_id, value, reject_reason(value, error))
+            del data[rental_id]
+            continue
+        if debug:
+            logger.debug('%s: %s', rental_id, value)
+        if summary is not None:
+            summary.add(value)
 
     return data
 
-def save_to_json(filename, data):
-    with open(filename, 'w') as file:
-        json.dump(data, file)
+
+def calculate_additional_fields_batch(data):
+    '''
+    Same result as calculate_additional_fields, computed a column at a time:
+    total_days is worked out once per distinct (rental_start, rental_end)
+    pair, the other derived fields are one map each over plain lists, so
+    every row keeps the int or float type the row engine gives it, and the
+    only per-row Python work left is storing the four fields
+    '''
+    values = list(data.values())
+    try:
+        spans = {}
+        total_days = []
+        for value in values:
+            span = (value['rental_start'], value['rental_end'])
+            days = spans.get(span)
+            if days is None:
+                days = spans[span] = parse_date(span[1]) - parse_date(span[0])
+            total_days.append(days)
+        total_price = list(map(operator.mul, total_days,
+                               map(operator.itemgetter('price_per_day'), values)))
+        sqrt_total_price = list(map(math.sqrt, total_price))
+        unit_cost = list(map(operator.truediv, total_price,
+                             map(operator.itemgetter('units_rented'), values)))
+    except Exception as error:
+        logger.error('batch calculation failed: %s', error)
+        exit(0)
+
+    for value, days, price, sqrt_price, cost in zip(values, total_days, total_price,
+                                                    sqrt_total_price, unit_cost):
+        value['total_days'] = days
+        value['total_price'] = price
+        value['sqrt_total_price'] = sqrt_price
+        value['unit_cost'] = cost
+
+    return data
+
+
+def calculate_shard(rows):
+    '''
+    Calculate one shard of (rental_start, rental_end, price_per_day,
+    units_rented) rows in a worker process, returning (total_days,
+    total_price, sqrt_total_price, unit_cost) rows, or the reject reason
+    for a rental that failed
+    '''
+    fields = []
+    for rental_start, rental_end, price_per_day, units_rented in rows:
+        value = {'rental_start': rental_start, 'rental_end': rental_end,
+                 'price_per_day': price_per_day, 'units_rented': units_rented}
+        try:
+            calculate_rental(value)
+        except Exception as error:
+            fields.append(reject_reason(value, error))
+            continue
+        fields.append((value['total_days'], value['total_price'],
+                       value['sqrt_total_price'], value['unit_cost']))
+    return fields
+
+
+def calculate_additional_fields_parallel(data, workers, shard_size=None, rejects=None,
+                                         summary=None):
+    '''
+    Same result as calculate_additional_fields, with the rentals split into
+    shards calculated by a pool of workers processes. Only the four input
+    fields go to the workers and only the four derived fields come back;
+    shards are merged in input order, so the output keeps the RNT order
+    '''
+    items = list(data.items())
+    if shard_size is None:
+        shard_size = max(1, -(-len(items) // (workers * 4)))
+    shards = ([(value['rental_start'], value['rental_end'], value['price_per_day'],
+                value['units_rented']) for _, value in items[start:start + shard_size]]
+              for start in range(0, len(items), shard_size))
+
+    debug = logger.isEnabledFor(logging.DEBUG)
+    with Pool(workers) as pool:
+        start = 0
+        for fields in pool.imap(calculate_shard, shards):
+            for (rental_id, value), derived in zip(items[start:start + len(fields)], fields):
+                if isinstance(derived, str):
+                    if rejects is None:
+                        logger.error('%s: %s', rental_id, derived)
+                        exit(0)
+                    write_reject(rejects, rental_id, value, derived)
+                    del data[rental_id]
+                    continue
+                (value['total_days'], value['total_price'],
+                 value['sqrt_total_price'], value['unit_cost']) = derived
+                if debug:
+                    logger.debug('%s: %s', rental_id, value)
+                if summary is not None:
+                    summary.add(value)
+            start += len(fields)
+    return data
+
+
+# One '"id": {...}' rental whose value is a flat object, strings and all
+RECORD_PATTERN = re.compile(rb'"([^"\\]*+)"\s*+:\s*+'
+                            rb'(\{[^{}"]*+(?:"[^"\\]*+(?:\\.[^"\\]*+)*+"[^{}"]*+)*+\})')
+
+
+def split_records(raw, input_filename, backend='auto'):
+    '''
+    (ids, texts, flat) of the rentals in raw, the bytes of input_filename,
+    texts being the JSON of each rental value. An export in the usual
+    layout, one object of flat rental objects, is split with a single
+    RECORD_PATTERN pass, so each text is the rental exactly as read and
+    nothing is decoded; any other layout is decoded and each rental
+    encoded again, and flat is False
+    '''
+    parts = RECORD_PATTERN.split(raw)
+    ids, texts = parts[1::3], parts[2::3]
+    # Between the records there must be nothing but the braces and commas
+    layout = b''.join(parts[0::3]).translate(None, b' \t\r\n')
+    if layout == b'{' + b',' * max(len(ids) - 1, 0) + b'}' and len(set(ids)) == len(ids):
+        return list(map(bytes.decode, ids)), texts, True
+
+    logger.warning('%s is not a plain object of flat rentals, encoding every rental to '
+                   'compare it', input_filename)
+    _, dumps = json_backend(backend)
+    data = load_rentals_file(input_filename, backend)
+    return list(data), list(map(dumps, data.values())), False
+
+
+def fingerprints(texts):
+    '''
+    Short hash of the JSON text of every rental
+    '''
+    digest = partial(hashlib.blake2b, digest_size=8)
+    return list(map(operator.methodcaller('hexdigest'), map(digest, texts)))
+
+
+def encode_rentals(rentals, flat=True):
+    '''
+    The rentals as save_to_json writes them, without the braces, and the
+    length of each one's text in it. They are encoded in one call; for
+    flat rentals the per rental work is only finding where the next one
+    starts, at its '}, "id": {' (quotes in strings are escaped and there
+    are no nested objects to hold one). Other rentals are measured by
+    encoding each one on its own
+    '''
+    text = json.dumps(rentals)[1:-1]
+    if not flat:
+        lengths = [len(json.dumps(rental_id)) + 2 + len(json.dumps(value))
+                   for rental_id, value in rentals.items()]
+        return text.encode(), lengths
+    lengths = []
+    start = 0
+    keys = map(json.dumps, rentals)
+    next(keys, None)
+    for key in keys:
+        end = text.index('}, %s: {' % key, start) + 1
+        lengths.append(end - start)
+        start = end + 2
+    if rentals:
+        lengths.append(len(text) - start)
+    return text.encode(), lengths
+
+
+def remove_index(output_filename):
+    '''
+    Delete the fingerprint index of output_filename, if there is one
+    '''
+    try:
+        os.remove(output_filename + INDEX_SUFFIX)
+    except FileNotFoundError:
+        pass
+
+
+def output_stamp(output_filename):
+    '''
+    Size and modification time of the output, to tell whether an index
+    still belongs to it
+    '''
+    stat = os.stat(output_filename)
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def load_index(output_filename, backend='auto'):
+    '''
+    The fingerprint index of the previous run that wrote output_filename:
+    the hash of the whole input, the ids, digests and output text lengths
+    of its rentals (0 for a rejected one) and the rejects file line of
+    every rejected rental. None if there is no index or it was written for
+    another version of the output
+    '''
+    loads, _ = json_backend(backend)
+    try:
+        with open(output_filename + INDEX_SUFFIX, 'rb') as file:
+            index = loads(file.read())
+        if index['output'] != output_stamp(output_filename):
+            logger.warning('%s changed since its index was written, recalculating '
+                           'everything', output_filename)
+            return None
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+    return index
+
+
+def save_incremental(output_filename, input_filename, calculate=calculate_additional_fields,
+                     rejects=None, backend='auto'):
+    '''
+    Write the same file as save_to_json, reusing the previous run. If the
+    input hashes the same as last time the output is left as it is.
+    Otherwise a rental whose JSON text in the input hashes to its digest
+    in the index is not decoded or calculated again, and runs of such
+    rentals that were written side by side are copied from the old output
+    as single byte spans; only new or changed rentals go through
+    calculate(rentals, rejects), any of the calculate_additional_fields
+    variants, and the encoder.
+
+    Rentals the previous run rejected are in the index too, with their
+    rejects line, which is written to rejects again instead of rejecting
+    them anew; without rejects they are recalculated, so the run ends on
+    them like a full one would.
+
+    The index, JSON holding the output size and mtime and the per rental
+    lists, is removed before the output is replaced and written after, so
+    a crash in between only costs a recalculation next time. Returns the
+    number of rentals recalculated and the number in the input
+    '''
+    with open(input_filename, 'rb') as file:
+        raw = file.read()
+    source = hashlib.blake2b(raw, digest_size=16).hexdigest()
+    index = load_index(output_filename, backend)
+    if index is None:
+        index = {'input': None, 'ids': [], 'digests': [], 'lengths': [], 'rejects': {}}
+    old_rejects = index['rejects']
+    if index['input'] == source and (rejects is not None or not old_rejects):
+        if rejects is not None:
+            rejects.writelines(old_rejects.values())
+        return 0, len(index['ids'])
+
+    ids, texts, flat = split_records(raw, input_filename, backend)
+    del raw
+    digests = fingerprints(texts)
+    # Where each rental was in the previous run, by position when nothing moved
+    old_ids, old_digests, old_lengths = index['ids'], index['digests'], index['lengths']
+    if ids == old_ids:
+        positions = range(len(ids))
+    else:
+        positions = list(map(dict(zip(old_ids, range(len(old_ids)))).get, ids))
+    old_starts = list(accumulate((length + 2 if length else 0 for length in old_lengths),
+                                 initial=1))
+
+    loads, _ = json_backend(backend)
+    changed = {}
+    for rental_id, text, digest, position in zip(ids, texts, digests, positions):
+        if (position is None or old_digests[position] != digest
+                or (rejects is None and not old_lengths[position])):
+            changed[rental_id] = loads(text)
+    del texts
+    captured = io.StringIO() if rejects is not None else None
+    calculated = calculate(dict(changed), captured)
+    new_rejects = {}
+    if captured is not None:
+        for line in captured.getvalue().splitlines(keepends=True):
+            new_rejects[json.loads(line)['rental_id']] = line
+
+    previous = b''
+    if len(changed) < len(ids) and any(old_lengths):
+        with open(output_filename, 'rb') as file:
+            previous = file.read()
+    encoded, new_lengths = encode_rentals(calculated, flat)
+    new_starts = dict(zip(calculated, accumulate((length + 2 for length in new_lengths),
+                                                 initial=0)))
+    new_lengths = dict(zip(calculated, new_lengths))
+    # Spans of the old output or the new text that follow on are copied as one
+    pieces = []
+    lengths = []
+    rejected = {}
+    run = run_start = run_end = None
+    for rental_id, position in zip(ids, positions):
+        if rental_id in changed:
+            if rental_id not in calculated:
+                rejected[rental_id] = new_rejects[rental_id]
+                lengths.append(0)
+                continue
+            length = new_lengths[rental_id]
+            buffer, start = encoded, new_starts[rental_id]
+        else:
+            length = old_lengths[position]
+            if not length:
+                rejected[rental_id] = old_rejects[rental_id]
+                lengths.append(0)
+                continue
+            buffer, start = previous, old_starts[position]
+        lengths.append(length)
+        if buffer is run and start == run_end + 2:
+            run_end = start + length
+        else:
+            if run is not None:
+                pieces.append(memoryview(run)[run_start:run_end])
+            run, run_start, run_end = buffer, start, start + length
+    if run is not None:
+        pieces.append(memoryview(run)[run_start:run_end])
+
+    partial_output = output_filename + '.tmp'
+    with open(partial_output, 'wb') as file:
+        file.write(b'{' + b', '.join(pieces) + b'}')
+    del pieces, previous, encoded
+    if rejects is not None:
+        rejects.writelines(rejected.values())
+    remove_index(output_filename)
+    os.replace(partial_output, output_filename)
+
+    _, dumps = json_backend(backend)
+    index = {'output': output_stamp(output_filename), 'input': source, 'ids': ids,
+             'digests': digests, 'lengths': lengths, 'rejects': rejected}
+    with open(partial_output, 'wb') as file:
+        file.write(dumps(index))
+    os.replace(partial_output, output_filename + INDEX_SUFFIX)
+    return len(changed), len(ids)
+
+
+def save_to_json(filename, data, compact=False, ndjson=False, backend='auto'):
+    '''
+    Write the rentals as one JSON object, byte for byte what json.dump
+    writes, unless compact or ndjson (one rental object per line, its id
+    under rental_id) asks for the faster whitespace-free encoding of the
+    backend. A fingerprint index left by an incremental run is removed, as
+    its offsets no longer match the file
+    '''
+    remove_index(filename)
+    if not (compact or ndjson):
+        with open(filename, 'w') as file:
+            file.write(json.dumps(data))
+        return
+
+    _, dumps = json_backend(backend)
+    with open(filename, 'wb') as file:
+        if ndjson:
+            file.writelines(dumps(dict(rental_id=rental_id, **value)) + b'\n'
+                            for rental_id, value in data.items())
+        else:
+            file.write(dumps(data))
+
+
+class RentalReader:
+    '''
+    Reads (rental id, rental) pairs from a file holding one top-level JSON
+    object, chunk_size characters at a time instead of the whole file.
+    offset() is how many UTF-8 bytes of the file lie before the end of the
+    last pair read; a reader given that offset as start, on the same file
+    seeked there, carries on with the next rental
+    '''
+
+    def __init__(self, file, chunk_size=CHUNK_SIZE, start=0):
+        self.file = file
+        self.chunk_size = chunk_size
+        self.start = start
+        # Bytes before buffer, the buffer and the end of the last pair in it
+        self.dropped = start
+        self.buffer = ''
+        self.pos = 0
+
+    def offset(self):
+        '''
+        Byte offset in the file just after the last rental read
+        '''
+        return self.dropped + len(self.buffer[:self.pos].encode('utf-8'))
+
+    def __iter__(self):
+        file = self.file
+        chunk_size = self.chunk_size
+        decoder = json.JSONDecoder()
+        dropped = self.start
+        buffer = ''
+        pos = 0
+        eof = False
+
+        def read_more():
+            nonlocal buffer, pos, eof, dropped
+            more = file.read(chunk_size)
+            eof = not more
+            dropped += len(buffer[:pos].encode('utf-8'))
+            buffer = buffer[pos:] + more
+            pos = 0
+
+        def skip_space():
+            nonlocal pos
+            while True:
+                while pos < len(buffer) and buffer[pos].isspace():
+                    pos += 1
+                if pos < len(buffer) or eof:
+                    return
+                read_more()
+
+        def decode():
+            nonlocal pos
+            while True:
+                try:
+                    value, end = decoder.raw_decode(buffer, pos)
+                except json.JSONDecodeError:
+                    if eof:
+                        raise
+                    read_more()
+                    continue
+                # A number may be cut short at the end of the buffer
+                if end == len(buffer) and not eof:
+                    read_more()
+                    continue
+                pos = end
+                return value
+
+        def expect(characters):
+            nonlocal pos
+            skip_space()
+            if pos >= len(buffer) or buffer[pos] not in characters:
+                raise json.JSONDecodeError('Expecting one of %r' % characters, buffer, pos)
+            pos += 1
+            return buffer[pos - 1]
+
+        if self.start:
+            if expect(',}') == '}':
+                return
+        else:
+            expect('{')
+            skip_space()
+            if pos < len(buffer) and buffer[pos] == '}':
+                return
+        while True:
+            skip_space()
+            key = decode()
+            expect(':')
+            skip_space()
+            value = decode()
+            self.dropped, self.buffer, self.pos = dropped, buffer, pos
+            yield key, value
+            if expect(',}') == '}':
+                return
+            if pos > chunk_size:
+                dropped += len(buffer[:pos].encode('utf-8'))
+                buffer = buffer[pos:]
+                pos = 0
+
+
+def iter_rentals(file, chunk_size=CHUNK_SIZE):
+    '''
+    Yield (rental id, rental) pairs from a file holding one top-level JSON
+    object, reading chunk_size characters at a time instead of the whole file
+    '''
+    return iter(RentalReader(file, chunk_size))
+
+
+def load_checkpoint(checkpoint_filename, input_filename):
+    '''
+    Progress recorded by an interrupted stream_rentals run over the same
+    input, or a fresh start
+    '''
+    fresh = {'input': os.path.abspath(input_filename), 'records': 0, 'written': 0,
+             'input_offset': 0, 'output_offset': 0, 'rejects_offset': 0}
+    if not checkpoint_filename or not os.path.exists(checkpoint_filename):
+        return fresh
+    with open(checkpoint_filename) as file:
+        state = json.load(file)
+    if state.get('input') != fresh['input'] or 'input_offset' not in state:
+        return fresh
+    return state
+
+
+def save_checkpoint(checkpoint_filename, state):
+    '''
+    Atomically replace the checkpoint file with state
+    '''
+    partial = checkpoint_filename + '.tmp'
+    with open(partial, 'w') as file:
+        json.dump(state, file)
+    os.replace(partial, checkpoint_filename)
+
+
+def open_at(filename, offset):
+    '''
+    Open filename for writing from offset, dropping anything written after
+    the last checkpoint
+    '''
+    if not offset:
+        return open(filename, 'w')
+    file = open(filename, 'r+')
+    file.seek(offset)
+    file.truncate()
+    return file
+
+
+def stream_rentals(input_filename, output_filename, rejects_filename=None,
+                   checkpoint_filename=None, checkpoint_every=CHECKPOINT_EVERY,
+                   summary=None):
+    '''
+    Calculate and write rentals one at a time so memory stays flat however
+    big the export is; the output matches save_to_json.
+
+    With rejects_filename bad rentals are quarantined there instead of
+    ending the run. With checkpoint_filename the progress is saved every
+    checkpoint_every rentals, and a rerun seeks the input, output and
+    rejects files to their offsets at the last save instead of starting
+    over; the checkpoint is removed once the run ends.
+    Calculated rentals are added to summary, whose totals are saved with
+    the checkpoint too
+    '''
+    state = load_checkpoint(checkpoint_filename, input_filename)
+    if summary is not None and 'summary' in state:
+        summary.totals = state['summary']
+    if state['records']:
+        logger.warning('resuming %s after %d rentals', input_filename, state['records'])
+    debug = logger.isEnabledFor(logging.DEBUG)
+    rejects = None
+    # Without a checkpoint to resume from, an unfinished run leaves the old output alone
+    target = output_filename if checkpoint_filename else output_filename + '.tmp'
+    with open(input_filename, 'rb') as binary, \
+            open_at(target, state['output_offset']) as output:
+        binary.seek(state['input_offset'])
+        source = io.TextIOWrapper(binary, encoding='utf-8', newline='')
+        reader = RentalReader(source, start=state['input_offset'])
+        if rejects_filename:
+            rejects = open_at(rejects_filename, state['rejects_offset'])
+        try:
+            if not state['output_offset']:
+                output.write('{')
+            records = state['records']
+            for rental_id, value in reader:
+                records += 1
+                try:
+                    calculate_rental(value)
+                except Exception as error:
+                    if rejects is None:
+                        logger.error('%s: %s', rental_id, reject_reason(value, error))
+                        exit(0)
+                    write_reject(rejects, rental_id, value, reject_reason(value, error))
+                else:
+                    if debug:
+                        logger.debug('%s: %s', rental_id, value)
+                    output.write('%s%s: %s' % (', ' if state['written'] else '',
+                                               json.dumps(rental_id), json.dumps(value)))
+                    state['written'] += 1
+                    if summary is not None:
+                        summary.add(value)
+                if checkpoint_filename and records % checkpoint_every == 0:
+                    output.flush()
+                    state['output_offset'] = output.tell()
+                    if rejects:
+                        rejects.flush()
+                        state['rejects_offset'] = rejects.tell()
+                    state['records'] = records
+                    state['input_offset'] = reader.offset()
+                    if summary is not None:
+                        state['summary'] = summary.state()
+                    save_checkpoint(checkpoint_filename, state)
+            output.write('}')
+        finally:
+            if rejects:
+                rejects.close()
+
+    if target != output_filename:
+        os.replace(target, output_filename)
+    if checkpoint_filename and os.path.exists(checkpoint_filename):
+        os.remove(checkpoint_filename)
+
+
+def main(args):
+    '''
+    Run charges_calc with the parsed command line options
+    '''
+    summary = RentalSummary() if args.summary else None
+    if args.stream:
+        stream_rentals(args.input, args.output, args.rejects, args.checkpoint,
+                       summary=summary)
+    else:
+        started = time.perf_counter()
+        rejects = open(args.rejects, 'w') if args.rejects else None
+        if args.workers:
+            calculate = lambda rentals, rejects: calculate_additional_fields_parallel(
+                rentals, args.workers, rejects=rejects, summary=summary)
+        elif args.batch:
+            calculate = lambda rentals, rejects: calculate_additional_fields_batch(rentals)
+        else:
+            calculate = lambda rentals, rejects: calculate_additional_fields(
+                rentals, rejects, summary)
+        if args.incremental:
+            changed, rentals = save_incremental(args.output, args.input, calculate, rejects,
+                                                args.json)
+            print('%d of %d rentals recalculated' % (changed, rentals))
+        else:
+            data = calculate(load_rentals_file(args.input, args.json), rejects)
+            rentals = len(data)
+            if summary is not None and args.batch and not args.workers:
+                summary.update(data.values())
+            save_to_json(args.output, data, args.compact, args.ndjson, args.json)
+            if args.columns:
+                write_columns(args.columns, data)
+        if rejects:
+            rejects.close()
+        if args.workers:
+            elapsed = time.perf_counter() - started
+            print('%d rentals in %.2f s (%.0f records/second)'
+                  % (rentals, elapsed, rentals / elapsed))
+    if summary is not None:
+        summary.save(args.summary)
+
 
 if __name__ == "__main__":
     args = parse_cmd_arguments()
-    data = load_rentals_file(args.input)
-    data = calculate_additional_fields(data)
-    save_to_json(args.output, data)
+    setup_logging(args.debug, args.log_file)
+    try:
+        main(args)
+    finally:
+        stop_logging()
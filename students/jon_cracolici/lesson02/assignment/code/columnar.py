@@ -0,0 +1,176 @@
+'''
+Typed columnar file of calculated rentals
+
+    8 bytes   magic, b'RENTCOL1'
+    8 bytes   little-endian length of the JSON header
+    header    JSON: rows, byte order, product codes and, for every column,
+              its name, array typecode, offset and size in bytes
+    columns   each padded to an 8 byte boundary:
+              units_rented, price_per_day, total_days, total_price,
+              sqrt_total_price, unit_cost   int64 ('q') or float64 ('d')
+              product_code                  int32 index into the header's
+                                            product codes
+              rental_id_offsets             int64, rows + 1 offsets into
+              rental_id                     UTF-8 bytes of every id back to back
+
+The reader maps the file and hands out memoryview columns, so scanning a
+column costs no parsing and no copy.
+'''
+import json
+import mmap
+import struct
+import sys
+from array import array
+
+MAGIC = b'RENTCOL1'
+NUMERIC_FIELDS = ('units_rented', 'price_per_day', 'total_days', 'total_price',
+                  'sqrt_total_price', 'unit_cost')
+_LENGTH = struct.Struct('<Q')
+
+
+def _typecode(values):
+    '''
+    int64 when every value is an int, float64 otherwise
+    '''
+    if all(type(value) is int for value in values):
+        return 'q'
+    return 'd'
+
+
+def write_columns(filename, data):
+    '''
+    Write the calculated rentals in data (RNT id -> rental) as columns
+    '''
+    values = list(data.values())
+    columns = []
+    for field in NUMERIC_FIELDS:
+        column = [value[field] for value in values]
+        columns.append((field, array(_typecode(column), column)))
+
+    product_codes = {}
+    codes = array('i', (product_codes.setdefault(value['product_code'], len(product_codes))
+                        for value in values))
+    columns.append(('product_code', codes))
+
+    ids = [rental_id.encode('utf-8') for rental_id in data]
+    offsets = array('q', [0])
+    for rental_id in ids:
+        offsets.append(offsets[-1] + len(rental_id))
+    columns.append(('rental_id_offsets', offsets))
+    columns.append(('rental_id', array('B', b''.join(ids))))
+
+    layout = []
+    offset = 0
+    for name, column in columns:
+        size = len(column) * column.itemsize
+        layout.append({'name': name, 'typecode': column.typecode, 'offset': offset,
+                       'size': size})
+        offset += size + -size % 8
+    header = json.dumps({'rows': len(values), 'byteorder': sys.byteorder,
+                         'product_codes': list(product_codes), 'columns': layout})
+    header = header.encode('utf-8')
+    header += b' ' * (-(len(MAGIC) + _LENGTH.size + len(header)) % 8)
+
+    with open(filename, 'wb') as output:
+        output.write(MAGIC)
+        output.write(_LENGTH.pack(len(header)))
+        output.write(header)
+        for (_, column), entry in zip(columns, layout):
+            output.write(column.tobytes())
+            output.write(b'\0' * (-entry['size'] % 8))
+
+
+class RentalColumns:
+    '''
+    Read-only view of a columnar rentals file
+
+        with RentalColumns('out.col') as rentals:
+            revenue = sum(rentals['total_price'])
+    '''
+
+    def __init__(self, filename):
+        with open(filename, 'rb') as source:
+            self._buffer = mmap.mmap(source.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._buffer[:len(MAGIC)] != MAGIC:
+            self._buffer.close()
+            raise ValueError('%s is not a columnar rentals file' % filename)
+        start = len(MAGIC) + _LENGTH.size
+        length, = _LENGTH.unpack(self._buffer[len(MAGIC):start])
+        header = json.loads(self._buffer[start:start + length].decode('utf-8'))
+        if header['byteorder'] != sys.byteorder:
+            self._buffer.close()
+            raise ValueError('%s was written on a %s-endian machine'
+                             % (filename, header['byteorder']))
+
+        self.rows = header['rows']
+        self.product_codes = header['product_codes']
+        self._view = memoryview(self._buffer)
+        self.columns = {}
+        for entry in header['columns']:
+            offset = start + length + entry['offset']
+            self.columns[entry['name']] = self._view[offset:offset + entry['size']].cast(
+                entry['typecode'])
+
+    def __len__(self):
+        return self.rows
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def rental_id(self, row):
+        '''
+        RNT id of one row
+        '''
+        offsets = self.columns['rental_id_offsets']
+        return bytes(self.columns['rental_id'][offsets[row]:offsets[row + 1]]).decode('utf-8')
+
+    def rental_ids(self):
+        '''
+        Every RNT id, in row order
+        '''
+        blob = bytes(self.columns['rental_id']).decode('utf-8')
+        offsets = self.columns['rental_id_offsets']
+        if len(blob) == offsets[-1]:
+            return [blob[offsets[row]:offsets[row + 1]] for row in range(self.rows)]
+        return [self.rental_id(row) for row in range(self.rows)]
+
+    def products(self):
+        '''
+        product_code of every row, in row order
+        '''
+        return [self.product_codes[code] for code in self.columns['product_code']]
+
+    def array(self, name):
+        '''
+        A copy of one column as an array.array
+        '''
+        column = self.columns[name]
+        return array(column.format, column)
+
+    def close(self):
+        '''
+        Release the columns and unmap the file
+        '''
+        for column in self.columns.values():
+            column.release()
+        self.columns = {}
+        self._view.release()
+        self._buffer.close()
+
+
+def read_columns(filename):
+    '''
+    Every column of a columnar rentals file as an array.array, keyed by
+    name, plus rental_id and product_code decoded to lists of strings
+    '''
+    with RentalColumns(filename) as rentals:
+        columns = {name: rentals.array(name) for name in NUMERIC_FIELDS}
+        columns['rental_id'] = rentals.rental_ids()
+        columns['product_code'] = rentals.products()
+    return columns
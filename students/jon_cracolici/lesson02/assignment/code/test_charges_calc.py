@@ -0,0 +1,584 @@
+"""Unit Test Module for the rental charges calculator."""
+
+import datetime
+import io
+import json
+import logging
+import logging.handlers
+import os
+import sys
+import tempfile
+DIR_PATH = os.path.dirname(os.path.realpath(__file__))
+sys.path.append(DIR_PATH)
+
+import unittest
+import unittest.mock
+import benchmark_json
+import charges_calc
+import columnar
+
+SOURCE = os.path.join(DIR_PATH, 'source.json')
+
+
+def valid_rentals():
+    """Rentals from source.json that calculate without errors."""
+
+    with open(SOURCE) as file:
+        data = json.load(file)
+    valid = {}
+    for rental_id, value in data.items():
+        try:
+            charges_calc.calculate_rental(dict(value))
+        except (ValueError, ZeroDivisionError):
+            continue
+        valid[rental_id] = value
+    return valid
+
+
+class TestStreaming(unittest.TestCase):
+    """Streaming parse and write match json.load/json.dump."""
+
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.input = os.path.join(self.folder.name, 'in.json')
+        self.data = valid_rentals()
+        with open(self.input, 'w') as file:
+            json.dump(self.data, file, indent=2)
+
+    def tearDown(self):
+        self.folder.cleanup()
+
+    def test_iter_rentals(self):
+        """Every rental comes back in order whatever the chunk size."""
+        for chunk_size in (1, 7, 64, charges_calc.CHUNK_SIZE):
+            with open(SOURCE) as file:
+                pairs = list(charges_calc.iter_rentals(file, chunk_size))
+            with open(SOURCE) as file:
+                self.assertEqual(pairs, list(json.load(file).items()))
+
+    def test_numbers_across_chunks(self):
+        """Numbers split over a chunk boundary are read whole."""
+        text = '{"a": 12345, "b": {"x": [1.5, 2e3]} , "c": -7}'
+        for chunk_size in range(1, len(text) + 1):
+            pairs = dict(charges_calc.iter_rentals(io.StringIO(text), chunk_size))
+            self.assertEqual(pairs, json.loads(text))
+
+    def test_empty_and_bad(self):
+        """An empty object yields nothing and a truncated one raises."""
+        self.assertEqual(list(charges_calc.iter_rentals(io.StringIO(' { } '))), [])
+        with self.assertRaises(json.JSONDecodeError):
+            list(charges_calc.iter_rentals(io.StringIO('{"a": 1'), 2))
+
+    def test_resume_at_offset(self):
+        """A reader started at the offset after any rental reads the rest."""
+        text = '{"RNT1": {"product": "caf\u00e9 \u2615"}, "RNT2": 2, "\u00fc": [1, 2]}'
+        encoded = text.encode('utf-8')
+        pairs = list(json.loads(text).items())
+        for chunk_size in (1, 5, charges_calc.CHUNK_SIZE):
+            reader = charges_calc.RentalReader(io.StringIO(text), chunk_size)
+            for index, _ in enumerate(reader, 1):
+                offset = reader.offset()
+                rest = io.TextIOWrapper(io.BytesIO(encoded[offset:]), encoding='utf-8')
+                resumed = charges_calc.RentalReader(rest, chunk_size, start=offset)
+                self.assertEqual(list(resumed), pairs[index:])
+
+    def test_stream_matches_batch(self):
+        """stream_rentals writes the same file as the load/calculate/save path."""
+        streamed = os.path.join(self.folder.name, 'streamed.json')
+        saved = os.path.join(self.folder.name, 'saved.json')
+        charges_calc.stream_rentals(self.input, streamed)
+        data = charges_calc.calculate_additional_fields(
+            charges_calc.load_rentals_file(self.input))
+        charges_calc.save_to_json(saved, data)
+        with open(streamed) as first, open(saved) as second:
+            self.assertEqual(first.read(), second.read())
+
+
+class TestBatch(unittest.TestCase):
+    """The column-at-a-time engine gives the same dict of dicts."""
+
+    def test_matches_row_by_row(self):
+        """Every derived field and its type match calculate_additional_fields."""
+        mixed = valid_rentals()
+        for rental_id in list(mixed)[::7]:
+            mixed[rental_id]['price_per_day'] += 0.5
+        for rentals in (valid_rentals(), mixed):
+            expected = charges_calc.calculate_additional_fields(json.loads(json.dumps(rentals)))
+            result = charges_calc.calculate_additional_fields_batch(rentals)
+            self.assertEqual(list(result), list(expected))
+            for rental_id, value in expected.items():
+                self.assertEqual(result[rental_id], value)
+                for field in ('total_days', 'total_price', 'sqrt_total_price', 'unit_cost'):
+                    self.assertIs(type(result[rental_id][field]), type(value[field]))
+            self.assertEqual(json.dumps(result), json.dumps(expected))
+
+    def test_float_prices(self):
+        """Non-integer prices give float totals."""
+        data = {'RNT1': {'units_rented': 2, 'price_per_day': 2.5,
+                         'rental_start': '1/1/18', 'rental_end': '1/5/18'}}
+        value = charges_calc.calculate_additional_fields_batch(data)['RNT1']
+        self.assertEqual((value['total_days'], value['total_price'], value['unit_cost']),
+                         (4, 10.0, 5.0))
+
+
+class TestParallel(unittest.TestCase):
+    """Sharded calculation in a process pool."""
+
+    def test_matches_serial(self):
+        """Output and RNT order match the single process result."""
+        expected = charges_calc.calculate_additional_fields(valid_rentals())
+        for workers, shard_size in ((1, None), (3, None), (2, 17)):
+            result = charges_calc.calculate_additional_fields_parallel(
+                valid_rentals(), workers, shard_size)
+            self.assertEqual(list(result.items()), list(expected.items()))
+
+    def test_failed_shard(self):
+        """A rental that cannot be calculated stops the run like the serial path."""
+        data = valid_rentals()
+        data['RNT999'] = {'units_rented': 1, 'price_per_day': 1,
+                          'rental_start': '1/2/18', 'rental_end': '1/1/18'}
+        with self.assertRaises(SystemExit):
+            charges_calc.calculate_additional_fields_parallel(data, 2)
+
+
+class TestRejects(unittest.TestCase):
+    """Bad rentals are quarantined with a reason and the run carries on."""
+
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.input = os.path.join(self.folder.name, 'in.json')
+        self.rejects = os.path.join(self.folder.name, 'rejects.jsonl')
+        self.data = valid_rentals()
+        self.data['BAD1'] = {'units_rented': 0, 'price_per_day': 1,
+                             'rental_start': '1/1/18', 'rental_end': '1/2/18'}
+        self.data['BAD2'] = {'units_rented': 1, 'price_per_day': 1,
+                             'rental_start': '1/2/18', 'rental_end': '1/1/18'}
+        self.data['BAD3'] = {'units_rented': 1, 'price_per_day': 1,
+                             'rental_start': '1/2/18', 'rental_end': ''}
+        self.data['BAD4'] = {'units_rented': 1, 'price_per_day': -3,
+                             'rental_start': '1/1/18', 'rental_end': '1/3/18'}
+        with open(self.input, 'w') as file:
+            json.dump(self.data, file)
+
+    def tearDown(self):
+        self.folder.cleanup()
+
+    def read_rejects(self):
+        """Reject records keyed by rental id."""
+        with open(self.rejects) as file:
+            return {record['rental_id']: record for record in map(json.loads, file)}
+
+    def check_rejects(self):
+        """The four bad rentals are rejected with their reason and input fields."""
+        rejected = self.read_rejects()
+        self.assertEqual(sorted(rejected), ['BAD1', 'BAD2', 'BAD3', 'BAD4'])
+        self.assertEqual(rejected['BAD1']['reason'], 'units_rented is 0')
+        self.assertEqual(rejected['BAD2']['reason'], 'rental_end is before rental_start')
+        self.assertTrue(rejected['BAD3']['reason'].startswith('bad rental dates'))
+        self.assertEqual(rejected['BAD4']['reason'], 'price_per_day -3 is negative')
+        for rental_id, record in rejected.items():
+            self.assertEqual(record['rental'], self.data[rental_id])
+
+    def test_serial_and_parallel(self):
+        """Both in-memory paths drop the bad rentals and keep the good ones."""
+        expected = charges_calc.calculate_additional_fields(valid_rentals())
+        for workers in (0, 2):
+            data = charges_calc.load_rentals_file(self.input)
+            with open(self.rejects, 'w') as rejects:
+                if workers:
+                    result = charges_calc.calculate_additional_fields_parallel(
+                        data, workers, 7, rejects)
+                else:
+                    result = charges_calc.calculate_additional_fields(data, rejects)
+            self.assertEqual(list(result.items()), list(expected.items()))
+            self.check_rejects()
+
+    def test_failed_stream_keeps_output(self):
+        """A run ended by a bad rental leaves the previous output as it was."""
+        output = os.path.join(self.folder.name, 'out.json')
+        with open(output, 'w') as file:
+            file.write('{"RNT1": {}}')
+        with self.assertRaises(SystemExit):
+            charges_calc.stream_rentals(self.input, output)
+        with open(output) as file:
+            self.assertEqual(file.read(), '{"RNT1": {}}')
+
+    def test_resume_from_checkpoint(self):
+        """An interrupted stream resumes to the same output as one clean run."""
+        clean = os.path.join(self.folder.name, 'clean.json')
+        charges_calc.stream_rentals(self.input, clean, self.rejects)
+        self.check_rejects()
+
+        output = os.path.join(self.folder.name, 'out.json')
+        checkpoint = os.path.join(self.folder.name, 'checkpoint.json')
+        calculate_rental = charges_calc.calculate_rental
+        calls = []
+
+        def interrupted(value):
+            calls.append(value)
+            if len(calls) == 50:
+                raise KeyboardInterrupt
+            return calculate_rental(value)
+
+        charges_calc.calculate_rental = interrupted
+        try:
+            with self.assertRaises(KeyboardInterrupt):
+                charges_calc.stream_rentals(self.input, output, self.rejects, checkpoint, 16)
+        finally:
+            charges_calc.calculate_rental = calculate_rental
+        with open(checkpoint) as file:
+            state = json.load(file)
+        self.assertEqual(state['records'], 48)
+        with open(self.input, 'rb') as file:
+            file.seek(state['input_offset'])
+            self.assertEqual(file.read(1), b',')
+
+        charges_calc.stream_rentals(self.input, output, self.rejects, checkpoint, 16)
+        self.assertFalse(os.path.exists(checkpoint))
+        with open(clean) as first, open(output) as second:
+            self.assertEqual(first.read(), second.read())
+        self.check_rejects()
+
+
+class TestIncremental(unittest.TestCase):
+    """Incremental runs recalculate only changed rentals and write the same file."""
+
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.input = os.path.join(self.folder.name, 'in.json')
+        self.output = os.path.join(self.folder.name, 'out.json')
+        self.expected = os.path.join(self.folder.name, 'expected.json')
+
+    def tearDown(self):
+        self.folder.cleanup()
+
+    def check(self, data, recalculated, indent=None):
+        """save_incremental recalculates as many rentals as given and matches save_to_json."""
+        with open(self.input, 'w') as file:
+            json.dump(data, file, indent=indent)
+        self.assertEqual(charges_calc.save_incremental(self.output, self.input),
+                         (recalculated, len(data)))
+        charges_calc.save_to_json(
+            self.expected, charges_calc.calculate_additional_fields(json.loads(json.dumps(data))))
+        with open(self.output) as first, open(self.expected) as second:
+            self.assertEqual(first.read(), second.read())
+
+    def test_only_changes_recalculated(self):
+        """Changed, added and removed rentals are picked up, the rest reused."""
+        data = valid_rentals()
+        self.check(data, len(data))
+        self.check(data, 0)
+
+        ids = list(data)
+        data[ids[200]]['price_per_day'] += 1
+        self.check(data, 1)
+        data[ids[3]]['units_rented'] += 1
+        data[ids[10]]['rental_end'] = data[ids[10]]['rental_start']
+        del data[ids[0]]
+        data['RNTNEW'] = {'product_code': 'PRD1', 'units_rented': 2, 'price_per_day': 3,
+                          'rental_start': '1/1/18', 'rental_end': '1/9/18'}
+        self.check(data, 3)
+        self.assertEqual(charges_calc.load_index(self.output)['ids'], list(data))
+
+    def test_other_layouts(self):
+        """Indented inputs and ones that are not flat rentals are fingerprinted too."""
+        data = valid_rentals()
+        self.check(data, len(data), indent=2)
+        self.check(data, 0, indent=2)
+        data['RNT\u00e9'] = {'product_code': 'P{1}', 'units_rented': 1, 'price_per_day': 2,
+                              'rental_start': '1/1/18', 'rental_end': '1/2/18',
+                              'tags': {'nested': '"}'}}
+        # Encoded texts differ from the ones read before, so this is a fresh start
+        self.check(data, len(data))
+        self.check(data, 0)
+        data['RNT\u00e9']['units_rented'] = 2
+        self.check(data, 1)
+        with open(self.input, 'rb') as file:
+            ids, _, flat = charges_calc.split_records(file.read(), self.input)
+        self.assertFalse(flat)
+        self.assertEqual(ids, list(data))
+
+    def test_rejects_indexed(self):
+        """Rejected rentals are not recalculated but stay in the rejects file."""
+        data = valid_rentals()
+        data['BAD1'] = {'units_rented': 0, 'price_per_day': 1,
+                        'rental_start': '1/1/18', 'rental_end': '1/2/18'}
+        with open(self.input, 'w') as file:
+            json.dump(data, file)
+        rejects = os.path.join(self.folder.name, 'rejects.jsonl')
+        for recalculated in (len(data), 0):
+            with open(rejects, 'w') as file:
+                self.assertEqual(charges_calc.save_incremental(self.output, self.input,
+                                                               rejects=file),
+                                 (recalculated, len(data)))
+            with open(rejects) as file:
+                self.assertEqual([json.loads(line)['rental_id'] for line in file], ['BAD1'])
+        with self.assertRaises(SystemExit):
+            charges_calc.save_incremental(self.output, self.input)
+
+    def test_lost_index(self):
+        """Without a readable index everything is recalculated."""
+        data = valid_rentals()
+        self.check(data, len(data))
+        os.remove(self.output + charges_calc.INDEX_SUFFIX)
+        self.check(data, len(data))
+
+    def test_output_rewritten(self):
+        """An output rewritten since the index was made is not copied from."""
+        data = valid_rentals()
+        self.check(data, len(data))
+        charges_calc.save_to_json(
+            self.output, charges_calc.calculate_additional_fields(json.loads(json.dumps(data))),
+            compact=True)
+        self.assertFalse(os.path.exists(self.output + charges_calc.INDEX_SUFFIX))
+        self.check(data, len(data))
+
+        with open(self.output, 'rb') as file:
+            written = file.read()
+        with open(self.output, 'wb') as file:
+            file.write(written.replace(b', ', b',', 1))
+        self.check(data, len(data))
+        self.check(data, 0)
+
+
+class TestJSONBackends(unittest.TestCase):
+    """Every backend and layout writes the same rentals."""
+
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.output = os.path.join(self.folder.name, 'out.json')
+        self.data = charges_calc.calculate_additional_fields(valid_rentals())
+
+    def tearDown(self):
+        self.folder.cleanup()
+
+    def test_default_layout(self):
+        """Without compact or ndjson the file is exactly what json.dump writes."""
+        charges_calc.save_to_json(self.output, self.data)
+        with open(self.output) as file:
+            self.assertEqual(file.read(), json.dumps(self.data))
+
+    def test_layouts_round_trip(self):
+        """Compact and ndjson output read back to the same rentals in order."""
+        for backend in benchmark_json.available_backends():
+            charges_calc.save_to_json(self.output, self.data, compact=True, backend=backend)
+            loaded = charges_calc.load_rentals_file(self.output, backend)
+            self.assertEqual(list(loaded.items()), list(self.data.items()))
+
+            charges_calc.save_to_json(self.output, self.data, ndjson=True, backend=backend)
+            with open(self.output) as file:
+                lines = [json.loads(line) for line in file]
+            self.assertEqual([line.pop('rental_id') for line in lines], list(self.data))
+            self.assertEqual(lines, list(self.data.values()))
+
+    def test_unknown_backend(self):
+        """An unknown backend name raises ValueError."""
+        self.assertRaises(ValueError, charges_calc.json_backend, 'yaml')
+
+    def test_benchmark(self):
+        """The benchmark reports every available backend and layout."""
+        report = benchmark_json.bench_backends(1, repeat=1)
+        backends = benchmark_json.available_backends()
+        self.assertEqual(len(report), 1 + 2 * len(backends))
+        for record in report:
+            self.assertIn(record['backend'], backends)
+            self.assertGreater(record['seconds']['dump'], 0)
+
+
+class TestSummary(unittest.TestCase):
+    """Totals gathered while calculating match a second pass over the output."""
+
+    def expected(self, data):
+        """Totals computed the slow way, from the calculated rentals."""
+        report = {'product_code': {}, 'month': {}}
+        for value in data.values():
+            start = datetime.datetime.strptime(value['rental_start'], '%m/%d/%y')
+            for group, key in (('product_code', value['product_code']),
+                               ('month', start.strftime('%Y-%m'))):
+                totals = report[group].setdefault(key, {'rentals': 0, 'units_rented': 0,
+                                                        'total_price': 0, 'costs': []})
+                totals['rentals'] += 1
+                totals['units_rented'] += value['units_rented']
+                totals['total_price'] += value['total_price']
+                totals['costs'].append(value['unit_cost'])
+        for group in report.values():
+            for totals in group.values():
+                costs = totals.pop('costs')
+                totals['average_unit_cost'] = sum(costs) / len(costs)
+        return report
+
+    def check(self, summary, data):
+        """Every group matches, averages to rounding."""
+        report = summary.report()
+        expected = self.expected(data)
+        for group in report:
+            self.assertEqual(list(report[group]), sorted(expected[group]))
+            for key, totals in report[group].items():
+                average = totals.pop('average_unit_cost')
+                self.assertAlmostEqual(average, expected[group][key].pop('average_unit_cost'))
+                self.assertEqual(totals, expected[group][key])
+
+    def test_serial_and_parallel(self):
+        """The serial and sharded calculations gather the same totals."""
+        data = charges_calc.calculate_additional_fields(valid_rentals())
+        for workers in (0, 2):
+            summary = charges_calc.RentalSummary()
+            if workers:
+                charges_calc.calculate_additional_fields_parallel(
+                    valid_rentals(), workers, summary=summary)
+            else:
+                charges_calc.calculate_additional_fields(valid_rentals(), summary=summary)
+            self.check(summary, data)
+
+    def test_stream_resume(self):
+        """Totals survive a checkpointed stream that is interrupted and resumed."""
+        with tempfile.TemporaryDirectory() as folder:
+            source = os.path.join(folder, 'in.json')
+            output = os.path.join(folder, 'out.json')
+            checkpoint = os.path.join(folder, 'checkpoint.json')
+            with open(source, 'w') as file:
+                json.dump(valid_rentals(), file)
+
+            summary = charges_calc.RentalSummary()
+            add = summary.add
+            calls = []
+
+            def interrupted(value):
+                calls.append(value)
+                if len(calls) == 40:
+                    raise KeyboardInterrupt
+                add(value)
+
+            summary.add = interrupted
+            with self.assertRaises(KeyboardInterrupt):
+                charges_calc.stream_rentals(source, output, checkpoint_filename=checkpoint,
+                                            checkpoint_every=16, summary=summary)
+
+            summary = charges_calc.RentalSummary()
+            charges_calc.stream_rentals(source, output, checkpoint_filename=checkpoint,
+                                        checkpoint_every=16, summary=summary)
+            with open(output) as file:
+                self.check(summary, json.load(file))
+
+
+class TestLogging(unittest.TestCase):
+    """Logging is configured once and only pays for the levels asked for."""
+
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.log_file = os.path.join(self.folder.name, 'charges_calc.log')
+
+    def tearDown(self):
+        charges_calc.stop_logging()
+        charges_calc.logger.setLevel(logging.NOTSET)
+        self.folder.cleanup()
+
+    def test_level_zero(self):
+        """Nothing is enabled and no log file is created."""
+        charges_calc.setup_logging(0, self.log_file)
+        self.assertFalse(charges_calc.logger.isEnabledFor(logging.CRITICAL))
+        charges_calc.calculate_additional_fields(valid_rentals())
+        self.assertFalse(os.path.exists(self.log_file))
+
+    def test_debug_every_rental(self):
+        """Level 3 logs each rental to the file and leaves the console quiet."""
+        data = valid_rentals()
+        with unittest.mock.patch('sys.stderr', new_callable=io.StringIO) as console:
+            charges_calc.setup_logging(3, self.log_file)
+            charges_calc.calculate_additional_fields(data)
+            charges_calc.stop_logging()
+        with open(self.log_file) as file:
+            lines = file.readlines()
+        self.assertEqual(len(lines), len(data))
+        self.assertTrue(all(' DEBUG RNT' in line for line in lines))
+        self.assertEqual(console.getvalue(), '')
+
+    def test_configured_once(self):
+        """Setting up again replaces the queue handler instead of adding one."""
+        charges_calc.setup_logging(2, self.log_file)
+        charges_calc.setup_logging(1, self.log_file)
+        handlers = charges_calc.logger.handlers
+        self.assertEqual(len(handlers), 1)
+        self.assertIsInstance(handlers[0], logging.handlers.QueueHandler)
+        self.assertFalse(charges_calc.logger.isEnabledFor(logging.WARNING))
+        self.assertTrue(charges_calc.logger.isEnabledFor(logging.ERROR))
+
+
+class TestColumnar(unittest.TestCase):
+    """The columnar export reads back to the calculated rentals."""
+
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.filename = os.path.join(self.folder.name, 'out.col')
+
+    def tearDown(self):
+        self.folder.cleanup()
+
+    def check(self, data):
+        """Every column matches the rentals, value and type."""
+        columnar.write_columns(self.filename, data)
+        columns = columnar.read_columns(self.filename)
+        self.assertEqual(columns['rental_id'], list(data))
+        self.assertEqual(columns['product_code'],
+                         [value['product_code'] for value in data.values()])
+        for field in columnar.NUMERIC_FIELDS:
+            self.assertEqual(columns[field].tolist(), [value[field] for value in data.values()])
+            self.assertEqual([type(item) for item in columns[field]],
+                             [type(value[field]) for value in data.values()])
+
+    def test_round_trip(self):
+        """source.json rentals survive the round trip."""
+        self.check(charges_calc.calculate_additional_fields(valid_rentals()))
+
+    def test_float_prices_and_unicode_ids(self):
+        """Float prices become a float64 column and ids may be any text."""
+        data = charges_calc.calculate_additional_fields({
+            'RNTé1': {'product_code': 'PRDü', 'units_rented': 2, 'price_per_day': 2.5,
+                      'rental_start': '1/1/18', 'rental_end': '1/5/18'},
+            'RNT2': {'product_code': 'PRD1', 'units_rented': 3, 'price_per_day': 4.0,
+                     'rental_start': '1/1/18', 'rental_end': '1/2/18'}})
+        self.check(data)
+        with columnar.RentalColumns(self.filename) as rentals:
+            self.assertEqual(rentals['total_price'].format, 'd')
+            self.assertEqual(rentals.rental_id(0), 'RNTé1')
+            self.assertEqual(len(rentals), 2)
+
+    def test_empty_and_bad(self):
+        """No rentals give empty columns; other files are refused."""
+        self.check({})
+        with open(self.filename, 'wb') as file:
+            file.write(b'{"RNT1": {}}')
+        self.assertRaises(ValueError, columnar.RentalColumns, self.filename)
+
+
+class TestDates(unittest.TestCase):
+    """The fast date parser and its cache agree with strptime."""
+
+    def test_fast_path_matches_strptime(self):
+        """Every m/d/y date from 1969 to 2068 parses to the strptime ordinal."""
+        day = datetime.date(1969, 1, 1)
+        while day.year < 2069:
+            for text in ('%d/%d/%02d' % (day.month, day.day, day.year % 100),
+                         day.strftime('%m/%d/%y')):
+                expected = datetime.datetime.strptime(text, '%m/%d/%y').toordinal()
+                self.assertEqual(charges_calc.parse_date_ordinal(text), expected)
+            day += datetime.timedelta(days=5)
+
+    def test_bad_dates(self):
+        """Malformed or impossible dates still raise ValueError."""
+        for text in ('', '2/30/18', '13/1/18', '1/1/2018', 'a/b/c', '1-1-18', '1/\u0661/00'):
+            self.assertRaises(ValueError, charges_calc.parse_date_ordinal, text)
+
+    def test_cache_counters(self):
+        """Repeated date strings are served from the cache."""
+        data = valid_rentals()
+        charges_calc.parse_date.cache_clear()
+        charges_calc.calculate_additional_fields(data)
+        info = charges_calc.date_cache_info()
+        self.assertGreater(info.hits, 0)
+        self.assertLessEqual(info.currsize, charges_calc.DATE_CACHE_SIZE)
+        self.assertEqual(info.hits + info.misses, 2 * len(data))
+
+
+if __name__ == '__main__':
+    unittest.main()
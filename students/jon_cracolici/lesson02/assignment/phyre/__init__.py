@@ -0,0 +1,16 @@
+"""
+PhyRe - taxonomic distinctness of species samples against a master list.
+
+    population = load_population('pop.txt')
+    sample = Sample(population, 'sample.txt')
+    atd, taxonN, Taxon = ATDmean(population, sample)
+    vtd = ATDvariance(population, taxonN, sample, atd)
+    imbalance = euler(population, sample, atd, Taxon)
+    rows = Funnel(population, 1000, 10, 70)
+"""
+from .core import ATDmean, ATDvariance, PathLength, analyse, euler
+from .engine import EncodedPopulation, atd_statistics, distinctness
+from .engine import pairwise_differences
+from .funnel import Funnel, parallel_funnel
+from .population import Population, Sample, load_population, parse_population, read_sample
+from .incremental import DistinctnessAccumulator
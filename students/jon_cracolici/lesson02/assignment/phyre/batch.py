@@ -0,0 +1,58 @@
+"""
+Batch analysis of many sample files against one population.
+
+The population is handed to each worker process once; sample files are then
+read and analysed in the workers and their results come back in completion
+order together with the time each file took.
+"""
+import time
+from multiprocessing import Pool
+
+from .core import analyse
+from .population import Sample
+
+_POPULATION = None
+
+
+def _init_worker(population):
+    """Keep the parsed population in the worker so tasks only carry file names."""
+
+    global _POPULATION  # pylint: disable=global-statement
+    _POPULATION = population
+
+
+def analyse_file(population, filename):
+    """Return (filename, result, seconds, error) for one sample file.
+
+    A sample that cannot be read or analysed (missing file, species not in the
+    master list, fewer than two species) gives result None and the error text
+    instead of stopping the batch."""
+
+    started = time.perf_counter()
+    try:
+        result = analyse(population, Sample(population, filename))
+        error = None
+    except (OSError, KeyError, ZeroDivisionError) as exc:
+        result = None
+        error = '%s: %s' % (type(exc).__name__, exc)
+    return filename, result, time.perf_counter() - started, error
+
+
+def _analyse_file(filename):
+    return analyse_file(_POPULATION, filename)
+
+
+def run_batch(population, filenames, workers=None):
+    """Yield (filename, result, seconds, error) for every sample file as it completes.
+
+    With workers the files are spread over a process pool, otherwise they are
+    analysed one after another in this process."""
+
+    if not workers:
+        for filename in filenames:
+            yield analyse_file(population, filename)
+        return
+
+    with Pool(workers, initializer=_init_worker, initargs=(population,)) as pool:
+        for outcome in pool.imap_unordered(_analyse_file, filenames):
+            yield outcome
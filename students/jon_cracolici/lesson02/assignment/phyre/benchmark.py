@@ -0,0 +1,159 @@
+"""
+Benchmark PhyRe on synthetic populations.
+
+    python -m phyre.benchmark --species 1000 10000 --levels 5 --branching 4 -o bench.json
+    python -m phyre.benchmark --species 1000 10000 --baseline bench.json --tolerance 1.5
+
+For every population size a Taxon:/species master list is generated in a
+temporary directory and population parsing (plain and cached), PathLength,
+ATDmean, euler and Funnel are timed. The report is JSON, one record per size.
+With --baseline, any timing slower than tolerance times the matching record
+in an earlier report is listed and the exit status is 1.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+from .core import ATDmean, PathLength, euler
+from .funnel import Funnel
+from .population import load_population
+
+LEVEL_NAMES = ['Phylum', 'Class', 'Order', 'Family', 'Genus', 'Subgenus', 'Species']
+
+
+def level_names(levels):
+    """Names for the given number of taxonomic levels, highest first."""
+
+    names = LEVEL_NAMES[:levels]
+    names.extend('Level%d' % number for number in range(len(names), levels))
+    return names
+
+
+def write_population(filename, species, levels, branching, seed=0):
+    """Write a random master list where every taxon has up to branching children."""
+
+    rng = random.Random(seed)
+    taxon = level_names(levels)
+    with open(filename, 'w') as output:
+        output.write('Taxon: %s\n' % ' '.join(taxon))
+        for number in range(species):
+            parent = ''
+            names = []
+            for level in taxon:
+                parent = '%s%s%d' % (parent, level[0], rng.randrange(branching))
+                names.append(parent)
+            output.write('sp%d %s\n' % (number, ' '.join(names)))
+
+
+def best_time(func, *args, repeat=3):
+    """Return (fastest wall time in seconds, last result) of repeat calls."""
+
+    best = float('inf')
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func(*args)
+        best = min(best, time.perf_counter() - started)
+    return best, result
+
+
+def bench_population(folder, species, levels, branching, sample_size, permutations,
+                     repeat=3, seed=0):
+    """Time every stage for one synthetic population and return the record."""
+
+    popfile = os.path.join(folder, 'pop_%d_%d_%d.txt' % (species, levels, branching))
+    write_population(popfile, species, levels, branching, seed)
+
+    timings = {}
+    timings['parse'], population = best_time(load_population, popfile, 'n', 'n', False,
+                                             repeat=repeat)
+    load_population(popfile)
+    timings['cached_load'], _ = best_time(load_population, popfile, repeat=repeat)
+    timings['path_length'], _ = best_time(PathLength, population, repeat=repeat)
+
+    sample = random.Random(seed).sample(population.species, min(sample_size, species))
+    timings['atd_mean'], (atd, _, taxa) = best_time(ATDmean, population, sample,
+                                                    repeat=repeat)
+    timings['euler'], _ = best_time(euler, population, sample, atd, taxa, repeat=repeat)
+
+    dimension = min(sample_size, species)
+    timings['funnel'], _ = best_time(Funnel, population, permutations, dimension, dimension,
+                                     seed, repeat=repeat)
+
+    return {'species': species, 'levels': levels, 'branching': branching,
+            'sample_size': len(sample), 'permutations': permutations,
+            'taxa': population.taxon_n, 'seconds': timings}
+
+
+def regressions(report, baseline, tolerance):
+    """List 'stage at size' entries slower than tolerance times the baseline."""
+
+    def key(record):
+        return record['species'], record['levels'], record['branching']
+
+    previous = {key(record): record for record in baseline}
+    slower = []
+    for record in report:
+        old = previous.get(key(record))
+        if old is None:
+            continue
+        for stage, seconds in record['seconds'].items():
+            limit = old['seconds'].get(stage, float('inf')) * tolerance
+            if seconds > limit:
+                slower.append('%s at %d species: %.4f s (baseline %.4f s)'
+                              % (stage, record['species'], seconds, old['seconds'][stage]))
+    return slower
+
+
+def parse_cmd_arguments(argv=None):
+    """Command line options of the benchmark."""
+
+    parser = argparse.ArgumentParser(description='Benchmark PhyRe on synthetic populations.')
+    parser.add_argument('--species', type=int, nargs='+', default=[1000, 10000],
+                        help='population sizes to generate')
+    parser.add_argument('--levels', type=int, default=5, help='taxonomic levels')
+    parser.add_argument('--branching', type=int, default=4,
+                        help='children per taxon at each level')
+    parser.add_argument('--sample-size', type=int, default=50,
+                        help='species in the timed sample and funnel dimension')
+    parser.add_argument('--permutations', type=int, default=100,
+                        help='funnel permutations')
+    parser.add_argument('--repeat', type=int, default=3, help='runs per timing, best is kept')
+    parser.add_argument('-o', '--output', help='write the JSON report here instead of stdout')
+    parser.add_argument('--baseline', help='earlier JSON report to compare against')
+    parser.add_argument('--tolerance', type=float, default=1.5,
+                        help='allowed slowdown factor against the baseline')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    """Run the benchmark and return the exit status."""
+
+    args = parse_cmd_arguments(argv)
+    with tempfile.TemporaryDirectory() as folder:
+        report = [bench_population(folder, species, args.levels, args.branching,
+                                   args.sample_size, args.permutations, args.repeat)
+                  for species in args.species]
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as output:
+            output.write(text + '\n')
+    else:
+        print(text)
+
+    if args.baseline:
+        with open(args.baseline) as baseline:
+            slower = regressions(report, json.load(baseline), args.tolerance)
+        for line in slower:
+            sys.stderr.write('slower: %s\n' % line)
+        return 1 if slower else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,134 @@
+"""
+Binary cache of parsed population master lists.
+
+The first time a master list is loaded, its integer-coded level matrix is
+written next to it as <popfile>.phyrec:
+
+    8 bytes   magic, b'PHYREC1\\n'
+    8 bytes   little-endian length of the JSON header
+    header    JSON: source size/mtime/sha1, levels, species, taxon names,
+              coefficients and taxon counts, missing flag, byte order
+    padding   to a 4 byte boundary
+    matrix    one int32 column of taxon codes per level, level after level
+
+Later loads check the source size and mtime (falling back to its sha1 when
+those changed) and, if the source is unchanged, mmap the file and hand out
+memoryview columns without reparsing anything.
+"""
+import hashlib
+import json
+import mmap
+import os
+import struct
+import sys
+
+from .engine import EncodedPopulation
+
+MAGIC = b'PHYREC1\n'
+SUFFIX = '.phyrec'
+_LENGTH = struct.Struct('<Q')
+
+
+def cache_path(popfile):
+    """Where the cache for popfile lives."""
+
+    return popfile + SUFFIX
+
+
+def _fingerprint(popfile, with_hash=True):
+    stat = os.stat(popfile)
+    fingerprint = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+    if with_hash:
+        digest = hashlib.sha1()
+        with open(popfile, 'rb') as source:
+            for block in iter(lambda: source.read(1 << 20), b''):
+                digest.update(block)
+        fingerprint['sha1'] = digest.hexdigest()
+    return fingerprint
+
+
+def _write(target, header, columns):
+    """Write a cache file of a header dict and int32 column buffers, replacing
+    target atomically; failing to write is not an error."""
+
+    header = json.dumps(header).encode('utf-8')
+    padding = -(len(MAGIC) + _LENGTH.size + len(header)) % 4
+    partial = target + '.tmp'
+    try:
+        with open(partial, 'wb') as output:
+            output.write(MAGIC)
+            output.write(_LENGTH.pack(len(header)))
+            output.write(header)
+            output.write(b'\0' * padding)
+            for column in columns:
+                output.write(column)
+        os.replace(partial, target)
+    except OSError:
+        if os.path.exists(partial):
+            os.remove(partial)
+
+
+def write_cache(popfile, encoded, meta, missing='n'):
+    """Write the compiled form of popfile; meta holds its coefficient dicts.
+
+    Failing to write (read-only directory, full disk) is not an error, the
+    population simply gets parsed again next time."""
+
+    header = dict(meta)
+    header.update(source=_fingerprint(popfile), missing=missing, byteorder=sys.byteorder,
+                  taxon=encoded.taxon, species=encoded.species, names=encoded.names)
+    _write(cache_path(popfile), header, (column.tobytes() for column in encoded.codes))
+
+
+def read_cache(popfile, missing='n'):
+    """Return (EncodedPopulation, meta) from the cache of popfile, or None if it
+    is stale or damaged, in which case the caller parses the source again.
+
+    When only the size or mtime of the source changed and its sha1 still
+    matches, the header is rewritten with the new stat, so the next load is
+    back to a single mmap instead of hashing the source every time."""
+
+    target = cache_path(popfile)
+    try:
+        with open(target, 'rb') as source:
+            buffer = mmap.mmap(source.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        return None
+
+    try:
+        if buffer[:len(MAGIC)] != MAGIC:
+            return None
+        start = len(MAGIC) + _LENGTH.size
+        length, = _LENGTH.unpack(buffer[len(MAGIC):start])
+        header = json.loads(buffer[start:start + length].decode('utf-8'))
+
+        if header['missing'] != missing or header['byteorder'] != sys.byteorder:
+            return None
+        offset = start + length
+        offset += -offset % 4
+        rows = len(header['species'])
+        if len(buffer) != offset + 4 * rows * len(header['taxon']):
+            return None
+
+        source = header['source']
+        current = _fingerprint(popfile, with_hash=False)
+        if (current['size'], current['mtime_ns']) != (source['size'], source['mtime_ns']):
+            current = _fingerprint(popfile)
+            if current['sha1'] != source['sha1']:
+                return None
+            header['source'] = current
+            _write(target, header, (buffer[offset:],))
+
+        view = memoryview(buffer)
+        codes = []
+        for _ in header['taxon']:
+            codes.append(view[offset:offset + 4 * rows].cast('i'))
+            offset += 4 * rows
+
+        encoded = EncodedPopulation.from_columns(header['taxon'], header['species'],
+                                                 header['names'], codes)
+        meta = {key: header[key] for key in ('coef', 'path_lengths', 'file_coef',
+                                             'file_path_lengths', 'taxon_n', 'duplicates')}
+    except (ValueError, TypeError, KeyError, AttributeError, struct.error):
+        return None
+    return encoded, meta
@@ -0,0 +1,163 @@
+"""
+Taxonomic distinctness measures over an in-memory Population.
+
+These are the PhyRe.py routines with the module globals (taxon, coef,
+Taxon) passed in through the Population and return values instead, so
+they can be called repeatedly and from several threads or processes.
+"""
+from collections import Counter
+
+
+def PathLength(population):  # pylint: disable=invalid-name
+    """Return (coef, taxonN, pathLengths) derived from the number of taxa per level.
+
+    A taxon name is only counted at a level if it does not also appear at the
+    level above, and the raw step 1 - n[i]/n[i+1] is scaled so the path
+    lengths add up to 100. The distinct names of each level come straight
+    from the integer-coded population, so this is one pass over the master
+    list (none at all for a cached one)."""
+
+    taxon = population.taxon
+    encoded = population.encoded
+    taxon_n = {}
+    previous = set()
+    for t, names in zip(taxon, encoded.names):
+        names = set(names)
+        taxon_n[t] = len(names - previous)
+        previous = names
+
+    n = [float(taxon_n[t]) for t in taxon]
+    n.insert(0, 1.0)
+
+    raw = []
+    for i in range(len(n) - 1):
+        j = i + 1
+        if n[i] > n[j]:
+            c = 1
+        else:
+            c = (1 - n[i] / n[j])
+        raw.append(c)
+
+    s = sum(raw)
+    adjco = [i * 100 / s for i in raw]
+
+    coef = {}
+    path_lengths = {}
+    for i, t in enumerate(taxon):
+        coef[t] = sum(adjco[i:])
+        path_lengths[t] = adjco[i]
+
+    return coef, taxon_n, path_lengths
+
+
+def ATDmean(population, sample):  # pylint: disable=invalid-name
+    """Return (AvTD, taxonN, Taxon) for a sample of species names.
+
+    Taxon holds the counts of species in each taxon at every level and
+    taxonN the number of ordered species pairs that differ at each level."""
+
+    sample = list(sample)
+    N = len(sample)  # pylint: disable=invalid-name
+
+    taxa = {}
+    taxon_n = {}
+    atd = 0
+    n = 0
+    for t in population.taxon:
+        taxa[t] = dict(Counter(population.data[i][t] for i in sample))
+
+    for t in population.taxon:
+        taxon_n[t] = N * N - sum(count * count for count in taxa[t].values())
+        n = taxon_n[t] - n
+        atd = atd + (n * population.coef[t])
+        n = taxon_n[t]
+
+    atd /= (N * (N - 1))
+
+    return atd, taxon_n, taxa
+
+
+def ATDvariance(population, taxonN, sample, atd):  # pylint: disable=invalid-name
+    """Return the variation in taxonomic distinctness for a sample."""
+
+    vtd = 0
+    n = 0
+    for t in population.taxon:
+        n = taxonN[t] - n
+        vtd = vtd + n * population.coef[t] ** 2
+        n = taxonN[t]
+
+    N = len(sample)  # pylint: disable=invalid-name
+    n = N * (N - 1)
+
+    vtd = (vtd - ((atd * n) ** 2) / n) / n
+
+    return vtd
+
+
+def euler(population, sample, atd, Taxon):  # pylint: disable=invalid-name
+    """Return {'EI', 'TDmin', 'TDmax'}: von Euler's index of imbalance for a sample.
+
+    Taxon is the per-level taxon count dict returned by ATDmean. TDmin and
+    TDmax are the distinctness of the least and most evenly spread trees
+    with the same number of taxa at every level. Only the number of taxa per
+    level is used, so the cost does not grow with the sample size."""
+
+    taxon = population.taxon
+    coef = population.coef
+
+    n = len(sample)
+    TDmin = 0  # pylint: disable=invalid-name
+    N = 0  # pylint: disable=invalid-name
+    for t in taxon:
+        k = len(Taxon[t])
+        TDmin += coef[t] * (((k - 1) * (n - k + 1) * 2 + (k - 1) * (k - 2)) - N)
+        N += ((k - 1) * (n - k + 1) * 2 + (k - 1) * (k - 2)) - N
+
+    TDmin /= (n * (n - 1))
+
+    # The maximally balanced tree deals the species round robin into the
+    # taxa of the lowest level, then deals those taxa round robin into the
+    # taxa of the level above, reversing the order at each level. Only the
+    # group sizes matter for the pairwise counts.
+    sizes = {}
+    previous = None
+    for t in reversed(taxon):
+        groups = len(Taxon[t])
+        if previous is None:
+            sizes[t] = [(n - i + groups - 1) // groups for i in range(groups)]
+        else:
+            sizes[t] = [sum(sizes[previous][i::groups]) for i in range(groups)]
+        sizes[t].reverse()
+        previous = t
+
+    TDmax = 0  # pylint: disable=invalid-name
+    m = 0
+    for t in taxon:
+        taxon_n = n * n - sum(size * size for size in sizes[t])
+        m = taxon_n - m
+        TDmax += m * coef[t]
+        m = taxon_n
+
+    TDmax /= (n * (n - 1))
+
+    EI = (TDmax - atd) / (TDmax - TDmin)  # pylint: disable=invalid-name
+
+    return {'EI': EI, 'TDmin': TDmin, 'TDmax': TDmax}
+
+
+def analyse(population, sample):
+    """Return the results PhyRe reports for one sample of species names.
+
+    Keys are atd, vtd, euler (the euler() dict), N (taxonN), n (sample size)
+    and taxon (the per-level taxon counts)."""
+
+    sample = list(sample)
+    atd, taxon_n, taxa = ATDmean(population, sample)
+    vtd = ATDvariance(population, taxon_n, sample, atd)
+    return {'atd': atd,
+            'vtd': vtd,
+            'euler': euler(population, sample, atd, taxa),
+            'N': taxon_n,
+            'n': len(sample),
+            'taxon': taxa}
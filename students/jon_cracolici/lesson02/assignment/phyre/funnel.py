@@ -0,0 +1,128 @@
+"""
+Process-parallel Funnel permutation runner for PhyRe confidence limits.
+
+Every (dimension, chunk) task draws its random subsamples from its own
+random.Random stream seeded from the run seed, the dimension and the chunk
+number, so a run is reproducible for a given seed and chunk size whatever the
+worker count.
+"""
+import random
+from array import array
+from multiprocessing import Pool
+
+from .engine import distinctness, pairwise_differences
+from .quantiles import SKETCH_SIZE, make_summary
+
+FUNNEL_HEADER = ("dimension AvTD05%   AvTDmean  AvTD95%   AvTDup    "
+                 "VarTDlow   VarTD05%   VarTDmean  VarTD95%")
+
+_ENCODED = None
+_COEF = None
+
+
+def _init_worker(encoded, coef):
+    """Keep the encoded population in the worker so tasks only carry numbers."""
+
+    global _ENCODED, _COEF  # pylint: disable=global-statement
+    _ENCODED = encoded
+    _COEF = coef
+
+
+def _permute(task):
+    """Run one chunk of permutations for one dimension in a worker."""
+
+    seed, dimension, chunk, count = task
+    rng = random.Random('%s:%d:%d' % (seed, dimension, chunk))
+    population = range(len(_ENCODED))
+    avtd = array('d')
+    vartd = array('d')
+    for _ in range(count):
+        rows = rng.sample(population, dimension)
+        taxon_n = pairwise_differences(_ENCODED, rows)
+        atd, vtd = distinctness(taxon_n, _ENCODED.taxon, _COEF, dimension)
+        avtd.append(atd)
+        vartd.append(vtd)
+    return dimension, avtd, vartd
+
+
+def confidence_row(dimension, avtd, vartd):
+    """Reduce one dimension's AvTD and VarTD summaries to a funnel table row."""
+
+    return (dimension,
+            avtd.percentile(.05), avtd.mean(), avtd.percentile(.95), avtd.maximum,
+            vartd.minimum, vartd.percentile(.05), vartd.mean(), vartd.percentile(.95))
+
+
+def _tasks(seed, p, d1, d2, chunk_size):
+    for dimension in range(d1, d2 + 1):
+        for chunk, start in enumerate(range(0, p, chunk_size)):
+            yield seed, dimension, chunk, min(chunk_size, p - start)
+
+
+def parallel_funnel(encoded, coef, p, d1, d2, seed=None, workers=None, chunk_size=None,
+                    quantiles='sort', sketch_size=SKETCH_SIZE):
+    """Return funnel rows for every dimension from d1 to d2, p permutations each.
+
+    Dimensions are split into chunks of chunk_size permutations (default: one
+    chunk per dimension) and spread over a pool of workers processes. Chunk
+    results are folded into a quantiles mode summary as they arrive, so with
+    'select' or 'sketch' and a small chunk_size memory stays bounded."""
+
+    if seed is None:
+        seed = random.SystemRandom().randrange(2 ** 32)
+    chunk_size = chunk_size or p
+
+    rows = []
+    with Pool(workers, initializer=_init_worker, initargs=(encoded, coef)) as pool:
+        summaries = {}
+        remaining = {}
+        for dimension, avtd, vartd in pool.imap(_permute, _tasks(seed, p, d1, d2, chunk_size)):
+            if dimension not in summaries:
+                summaries[dimension] = (make_summary(quantiles, p, sketch_size, seed),
+                                        make_summary(quantiles, p, sketch_size, seed))
+                remaining[dimension] = p
+            avtd_summary, vartd_summary = summaries[dimension]
+            for value in avtd:
+                avtd_summary.add(value)
+            for value in vartd:
+                vartd_summary.add(value)
+            remaining[dimension] -= len(avtd)
+            if not remaining[dimension]:
+                rows.append(confidence_row(dimension, *summaries.pop(dimension)))
+
+    return rows
+
+
+def Funnel(population, p, d1, d2, seed=None, workers=0, chunk_size=None,  # pylint: disable=invalid-name
+           quantiles='sort', sketch_size=SKETCH_SIZE):
+    """Return the funnel table rows of AvTD/VarTD confidence limits for a Population.
+
+    Every dimension from d1 to d2 gets p random subsamples of the master list.
+    With workers the permutations run on a process pool (see parallel_funnel),
+    otherwise serially in this process from one Random(seed) stream."""
+
+    encoded = population.encoded
+    if workers:
+        return parallel_funnel(encoded, population.coef, p, d1, d2, seed, workers,
+                               chunk_size, quantiles, sketch_size)
+
+    rng = random.Random(seed)
+    species = range(len(encoded))
+    rows = []
+    for dimension in range(d1, d2 + 1):
+        avtd = make_summary(quantiles, p, sketch_size, seed)
+        vartd = make_summary(quantiles, p, sketch_size, seed)
+        for _ in range(p):
+            taxon_n = pairwise_differences(encoded, rng.sample(species, dimension))
+            atd, vtd = distinctness(taxon_n, encoded.taxon, population.coef, dimension)
+            avtd.add(atd)
+            vartd.add(vtd)
+        rows.append(confidence_row(dimension, avtd, vartd))
+    return rows
+
+
+def format_row(row):
+    """Format one funnel row the way the *_funnel.out table prints it."""
+
+    return '%i        %6.4f   %6.4f   %6.4f   %6.4f   %6.4f   %6.4f   %6.4f   %6.4f' % row
+
@@ -0,0 +1,85 @@
+"""
+Incremental AvTD/VarTD for a sample that changes one species at a time.
+
+The accumulator keeps, for every level, the species count of each taxon and
+the sum of the squared counts. Adding a species to a taxon holding c species
+raises that sum by 2c + 1 and removing one lowers it by 2c - 1, so taxonN
+(n^2 - sum of squares) and with it AvTD and VarTD are kept up to date in
+O(levels) per change.
+"""
+from collections import Counter
+
+from .engine import distinctness
+
+
+class DistinctnessAccumulator:
+    """Running taxonomic distinctness of a sample drawn from a Population."""
+
+    def __init__(self, population, sample=()):
+        self.encoded = population.encoded
+        self.coef = population.coef
+        self.members = set()
+        self.counts = [Counter() for _ in self.encoded.taxon]
+        self.squares = [0] * len(self.encoded.taxon)
+        for species in sample:
+            self.add_species(species)
+
+    def __len__(self):
+        return len(self.members)
+
+    def __contains__(self, species):
+        return species in self.members
+
+    def add_species(self, species):
+        """Add one species of the master list to the sample."""
+
+        if species in self.members:
+            raise ValueError('%s is already in the sample' % species)
+        row = self.encoded.index[species]
+        for level, column in enumerate(self.encoded.codes):
+            code = column[row]
+            count = self.counts[level][code]
+            self.squares[level] += 2 * count + 1
+            self.counts[level][code] = count + 1
+        self.members.add(species)
+
+    def remove_species(self, species):
+        """Remove one species from the sample."""
+
+        if species not in self.members:
+            raise KeyError(species)
+        row = self.encoded.index[species]
+        for level, column in enumerate(self.encoded.codes):
+            code = column[row]
+            count = self.counts[level][code]
+            self.squares[level] -= 2 * count - 1
+            if count == 1:
+                del self.counts[level][code]
+            else:
+                self.counts[level][code] = count - 1
+        self.members.discard(species)
+
+    @property
+    def taxon_n(self):
+        """Ordered species pairs that differ at each level, as ATDmean's taxonN."""
+
+        size = len(self.members)
+        return {level: size * size - square
+                for level, square in zip(self.encoded.taxon, self.squares)}
+
+    def statistics(self):
+        """Return (AvTD, VarTD) of the current sample (at least two species)."""
+
+        return distinctness(self.taxon_n, self.encoded.taxon, self.coef, len(self.members))
+
+    @property
+    def atd(self):
+        """Average taxonomic distinctness of the current sample."""
+
+        return self.statistics()[0]
+
+    @property
+    def vtd(self):
+        """Variation in taxonomic distinctness of the current sample."""
+
+        return self.statistics()[1]
@@ -0,0 +1,182 @@
+"""
+In-memory PhyRe population master list and sample loading.
+"""
+from collections.abc import Mapping
+from re import match
+
+from .cache import read_cache, write_cache
+from .core import PathLength
+from .engine import EncodedPopulation
+
+
+class Population:
+    """Parsed population master list.
+
+    taxon is the list of taxonomic levels (highest first), data maps each
+    species to its {level: taxon name} dict, coef and path_lengths are keyed
+    by level, taxon_n holds the number of taxa at each level and duplicates
+    lists species that appeared more than once in the master list."""
+
+    def __init__(self, taxon, data, coef=None, path_lengths=None, duplicates=None,
+                 encoded=None):
+        self.taxon = list(taxon)
+        self.data = data
+        self.coef = coef or {}
+        self.path_lengths = path_lengths or {}
+        self.taxon_n = {}
+        self.duplicates = duplicates or []
+        self._encoded = encoded
+
+    @classmethod
+    def from_encoded(cls, encoded, **kwargs):
+        """Population whose species data is decoded from encoded columns on demand."""
+
+        return cls(encoded.taxon, EncodedData(encoded), encoded=encoded, **kwargs)
+
+    def __len__(self):
+        return len(self.data)
+
+    def __contains__(self, species):
+        return species in self.data
+
+    @property
+    def species(self):
+        """Species names in master list order."""
+
+        return list(self.data)
+
+    @property
+    def encoded(self):
+        """Integer-coded copy of the master list, built on first use."""
+
+        if self._encoded is None:
+            self._encoded = EncodedPopulation(self.data, self.taxon)
+        return self._encoded
+
+
+class EncodedData(Mapping):
+    """Read-only {species: {level: taxon name}} view over an EncodedPopulation."""
+
+    def __init__(self, encoded):
+        self.encoded = encoded
+
+    def __getitem__(self, species):
+        row = self.encoded.index[species]
+        return {level: names[column[row]] for level, names, column
+                in zip(self.encoded.taxon, self.encoded.names, self.encoded.codes)}
+
+    def __iter__(self):
+        return iter(self.encoded.species)
+
+    def __len__(self):
+        return len(self.encoded.species)
+
+    def __contains__(self, species):
+        return species in self.encoded.index
+
+
+def parse_population(lines, missing='n'):
+    """Parse Taxon:/Coefficients:/species lines into a Population.
+
+    With missing == 'y' a '/' entry takes the name of the level above it.
+    Coefficients from the file are kept on the population as given."""
+
+    taxon = []
+    index = {}
+    coef = {}
+    path_lengths = {}
+    data = {}
+    duplicates = []
+
+    for line in lines:
+        if match('Taxon:', line):
+            x = line.split()
+            x.remove('Taxon:')
+            for position, level in enumerate(x):
+                taxon.append(level)
+                index[level] = position + 1
+            continue
+
+        if match('Coefficients:', line):
+            x = line.split()
+            x.remove('Coefficients:')
+            x = [float(value) for value in x]
+            for position, level in enumerate(taxon):
+                coef[level] = sum(x[position:])
+                path_lengths[level] = x[position]
+            continue
+
+        x = line.split()
+        if not x:
+            continue
+
+        species = x[0]
+        if species in data:
+            duplicates.append(species)
+
+        levels = {}
+        mtax = ''
+        for level in taxon:
+            name = x[index[level]]
+            if missing == 'y' and name == '/':
+                name = mtax
+            levels[level] = name
+            mtax = name
+        data[species] = levels
+
+    return Population(taxon, data, coef, path_lengths, duplicates)
+
+
+def load_population(popfile, missing='n', pathlengths='n', cache=True):
+    """Read a population master list file and derive its path lengths.
+
+    With pathlengths == 'n' the coefficients come from PathLength; with 'y'
+    the Coefficients: line of the file is used. With cache the parsed list
+    is reused from (or saved to) the binary cache next to popfile."""
+
+    cached = read_cache(popfile, missing) if cache else None
+    if cached is not None:
+        encoded, meta = cached
+        population = Population.from_encoded(encoded, coef=meta['file_coef'],
+                                              path_lengths=meta['file_path_lengths'],
+                                              duplicates=meta['duplicates'])
+        coef, taxon_n, path_lengths = meta['coef'], meta['taxon_n'], meta['path_lengths']
+    else:
+        with open(popfile) as lines:
+            population = parse_population(lines, missing)
+        coef, taxon_n, path_lengths = PathLength(population)
+        if cache:
+            write_cache(popfile, population.encoded,
+                        {'coef': coef, 'path_lengths': path_lengths,
+                         'file_coef': population.coef,
+                         'file_path_lengths': population.path_lengths,
+                         'taxon_n': taxon_n, 'duplicates': population.duplicates},
+                        missing)
+
+    population.taxon_n = taxon_n
+    if pathlengths == 'n':
+        population.coef = coef
+        population.path_lengths = path_lengths
+    return population
+
+
+def read_sample(population, lines):
+    """Return the {species: {level: name}} dict for the species listed in lines."""
+
+    sample = {}
+    for line in lines:
+        if match('Taxon:', line) or match('Coefficients:', line):
+            continue
+        x = line.split()
+        if not x:
+            continue
+        species = x[0]
+        sample[species] = population.data[species]
+    return sample
+
+
+def Sample(population, samplefile):  # pylint: disable=invalid-name
+    """Read a sample file of species names against the population."""
+
+    with open(samplefile) as lines:
+        return read_sample(population, lines)
@@ -0,0 +1,125 @@
+"""
+Bounded-memory summaries of Funnel permutations.
+
+Funnel only needs the 5%/95% entries, mean, min and max of each dimension's
+AvTD and VarTD values. A summary is fed one value at a time with add() and
+answers those questions without keeping a list of float objects around:
+
+    sort    - keep every value and sort once, exactly as Funnel always did
+    select  - exact, values packed into a preallocated array of doubles and
+              the percentile entry picked with a partial heap selection
+    sketch  - approximate, a fixed-size uniform reservoir of the values
+"""
+import abc
+import heapq
+import random
+from array import array
+
+QUANTILE_MODES = ('sort', 'select', 'sketch')
+SKETCH_SIZE = 10000
+
+
+class Summary(abc.ABC):
+    """Running count, sum, min and max shared by every summary."""
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.minimum = float('inf')
+        self.maximum = float('-inf')
+
+    def add(self, value):
+        """Account for one permutation value."""
+
+        self.count += 1
+        self.total += value
+        if value < self.minimum:
+            self.minimum = value
+        if value > self.maximum:
+            self.maximum = value
+
+    def mean(self):
+        """Mean of every value added."""
+
+        return self.total / self.count
+
+    @abc.abstractmethod
+    def percentile(self, fraction):
+        """Value at position int(fraction * count) of the sorted values."""
+
+
+class SortSummary(Summary):
+    """Keep every value in a list and sort it, the original Funnel behaviour."""
+
+    def __init__(self):
+        super().__init__()
+        self.values = []
+        self.ordered = True
+
+    def add(self, value):
+        super().add(value)
+        self.values.append(value)
+        self.ordered = False
+
+    def percentile(self, fraction):
+        if not self.ordered:
+            self.values.sort()
+            self.ordered = True
+        return self.values[int(fraction * self.count)]
+
+
+class SelectSummary(Summary):
+    """Exact percentiles from a preallocated array and a partial selection."""
+
+    def __init__(self, capacity):
+        super().__init__()
+        self.values = array('d', bytes(8 * capacity))
+
+    def add(self, value):
+        if self.count == len(self.values):
+            self.values.append(value)
+        else:
+            self.values[self.count] = value
+        super().add(value)
+
+    def percentile(self, fraction):
+        index = int(fraction * self.count)
+        values = self.values[:self.count] if self.count < len(self.values) else self.values
+        if index < self.count // 2:
+            return heapq.nsmallest(index + 1, values)[-1]
+        return heapq.nlargest(self.count - index, values)[-1]
+
+
+class SketchSummary(Summary):
+    """Approximate percentiles from a uniform reservoir of at most size values."""
+
+    def __init__(self, size=SKETCH_SIZE, seed=None):
+        super().__init__()
+        self.size = size
+        self.reservoir = []
+        self.rng = random.Random(seed)
+
+    def add(self, value):
+        super().add(value)
+        if len(self.reservoir) < self.size:
+            self.reservoir.append(value)
+        else:
+            slot = self.rng.randrange(self.count)
+            if slot < self.size:
+                self.reservoir[slot] = value
+
+    def percentile(self, fraction):
+        ordered = sorted(self.reservoir)
+        return ordered[int(fraction * len(ordered))]
+
+
+def make_summary(mode, p, sketch_size=SKETCH_SIZE, seed=None):
+    """Build the summary for one dimension's p permutations in the given mode."""
+
+    if mode == 'sort':
+        return SortSummary()
+    if mode == 'select':
+        return SelectSummary(p)
+    if mode == 'sketch':
+        return SketchSummary(sketch_size, seed)
+    raise ValueError('quantile mode must be one of %s, not %r' % (QUANTILE_MODES, mode))
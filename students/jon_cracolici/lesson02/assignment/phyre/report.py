@@ -0,0 +1,64 @@
+"""
+Text layout of the PhyRe .out and _funnel.out reports.
+"""
+from .funnel import FUNNEL_HEADER, format_row
+
+RULE = '-' * 51
+
+
+def format_header(population):
+    """Number of taxa and path length at each level of the master list."""
+
+    lines = ["Number of taxa and path lengths for each taxonomic level:"]
+    for t in population.taxon:
+        lines.append('%-10s\t%d\t%.4f' % (t, population.taxon_n[t], population.path_lengths[t]))
+    return '\n'.join(lines) + '\n\n'
+
+
+def format_sample(name, result, taxon):
+    """Result block for one sample, as returned by analyse()."""
+
+    lines = [RULE,
+             "Results for sample:  %s \n" % name,
+             "Dimension for this sample is %d \n" % result['n'],
+             "Number of taxa and pairwise comparisons  at each taxon level:"]
+    n = 0
+    for t in taxon:
+        lines.append('%-10s\t%i\t%i' % (t, len(result['taxon'][t]), result['N'][t] - n))
+        n = result['N'][t]
+    lines.append("\nNumber of pairwise comparisons is for pairs that differ "
+                 "at each level excluding comparisons that differ at upper levels")
+    lines.append('')
+    lines.append("Average taxonomic distinctness      = %.4f" % result['atd'])
+    lines.append("Variation in taxonomic distinctness = %.4f" % result['vtd'])
+    lines.append("Minimum taxonomic distinctness      = %.4f" % result['euler']['TDmin'])
+    lines.append("Maximum taxonomic distinctness      = %.4f" % result['euler']['TDmax'])
+    lines.append("von Euler's index of imbalance      = %.4f" % result['euler']['EI'])
+    return '\n'.join(lines) + '\n\n'
+
+
+def format_error(name, error):
+    """Result block for a sample that could not be analysed."""
+
+    return '\n'.join([RULE, "Results for sample:  %s \n" % name,
+                      "Sample could not be analysed: %s" % error]) + '\n\n'
+
+
+def format_funnel(rows, p):
+    """Whole *_funnel.out confidence limit table."""
+
+    lines = ["Confidence limits for average taxonomic distinctness and variation "
+             "in taxonomic distinctness",
+             "limits are lower 95% limit for AvTD and upper 95% limit for VarTD",
+             "",
+             "Number of permutations for confidence limits = %d \n" % p,
+             FUNNEL_HEADER]
+    lines.extend(format_row(row) for row in rows)
+    return '\n'.join(lines) + '\n'
+
+
+def write_funnel(filename, rows, p):
+    """Write the *_funnel.out confidence limit table."""
+
+    with open(filename, 'w') as output:
+        output.write(format_funnel(rows, p))
@@ -0,0 +1,496 @@
+"""Unit Test Module for the PhyRe taxonomic distinctness package."""
+
+import os
+import pickle
+import random
+import sys
+import tempfile
+DIR_PATH = os.path.dirname(os.path.realpath(__file__))
+sys.path.append(DIR_PATH)
+
+import unittest
+import unittest.mock
+from phyre.engine import EncodedPopulation, atd_statistics, pairwise_differences
+from phyre.funnel import confidence_row, parallel_funnel
+from phyre.quantiles import SketchSummary, Summary, make_summary
+from phyre import ATDmean, ATDvariance, Funnel, PathLength, euler, parse_population
+from phyre import read_sample
+from phyre import load_population
+from phyre import DistinctnessAccumulator
+from phyre.batch import run_batch
+from phyre.benchmark import bench_population, regressions
+from phyre.cache import cache_path, read_cache
+
+TAXON = ['Phylum', 'Class', 'Order', 'Family', 'Genus']
+
+
+def build_population(species_count=200, branching=3, seed=7):
+    """Build a random nested population dict in the PhyRe {species: {level: name}} shape."""
+
+    rng = random.Random(seed)
+    population = {}
+    for number in range(species_count):
+        parent = ''
+        population['sp%d' % number] = {}
+        for level in TAXON:
+            parent = '%s%s%d' % (parent, level[0], rng.randrange(branching))
+            population['sp%d' % number][level] = parent
+    return population
+
+
+def build_coef(path_lengths=(1.0, 2.0, 1.5, 0.5, 3.0)):
+    """Cumulative coefficients the way PhyRe derives coef from path lengths."""
+
+    return {level: sum(path_lengths[TAXON.index(level):]) for level in TAXON}
+
+
+def reference_atd(data, sample, coef):
+    """ATDmean and ATDvariance as written in PhyRe.py, used as the oracle."""
+
+    size = len(sample)
+    taxon_counts = {}
+    taxon_n = {}
+    atd = 0
+    n = 0
+    for t in TAXON:
+        taxon_counts[t] = {}
+        x = [data[i][t] for i in sample]
+        for i in set(x):
+            taxon_counts[t][i] = x.count(i)
+    for t in TAXON:
+        taxon_n[t] = sum([taxon_counts[t][i] * taxon_counts[t][j]
+                          for i in taxon_counts[t] for j in taxon_counts[t] if i != j])
+        n = taxon_n[t] - n
+        atd = atd + (n * coef[t])
+        n = taxon_n[t]
+    atd /= (size * (size - 1))
+
+    vtd = 0
+    n = 0
+    for t in TAXON:
+        n = taxon_n[t] - n
+        vtd = vtd + n * coef[t]**2
+        n = taxon_n[t]
+    n = size * (size - 1)
+    vtd = (vtd - ((atd*n)**2)/n)/n
+    return atd, vtd, taxon_n, taxon_counts
+
+
+def reference_euler(sample, atd, taxon_counts, coef):
+    """euler() as written in PhyRe.py, building the TaxMax membership lists."""
+
+    taxon = list(TAXON)
+    n = len(sample)
+    td_min = 0
+    big_n = 0
+    for t in taxon:
+        k = len(taxon_counts[t])
+        td_min += coef[t] * (((k-1)*(n-k +1)* 2+ (k-1)*(k-2))-big_n)
+        big_n += ((k-1)*(n-k +1)* 2 + (k-1)*(k-2))-big_n
+    td_min /= (n * (n-1))
+
+    taxon.reverse()
+    tax_max = {}
+    for t in taxon:
+        tax_max[t] = []
+        if taxon.index(t) == 0:
+            for i in range(len(taxon_counts[t])):
+                tax_max[t].append([sample[j] for j in range(i, n, len(taxon_counts[t]))])
+        else:
+            for i in range(len(taxon_counts[t])):
+                tax_max[t].append([])
+                s = taxon[taxon.index(t)-1]
+                for j in [tax_max[s][j] for j in range(i, len(taxon_counts[s]),
+                                                        len(taxon_counts[t]))]:
+                    tax_max[t][i] += j
+        tax_max[t].reverse()
+
+    taxon.reverse()
+    td_max = 0
+    n = 0
+    for t in taxon:
+        groups = tax_max[t]
+        pairs = sum([len(groups[i]) * len(groups[j]) for i in range(len(groups))
+                     for j in range(len(groups)) if i != j])
+        n = pairs - n
+        td_max += n * coef[t]
+        n = pairs
+    td_max /= (len(sample) * (len(sample)-1))
+    return {'EI': (td_max-atd)/(td_max-td_min), 'TDmin': td_min, 'TDmax': td_max}
+
+
+def reference_path_length(data):
+    """Taxa counted per level by PathLength in PhyRe.py, scanning the lists."""
+
+    taxon_n = {}
+    x = {}
+    for t in TAXON:
+        counts = {}
+        x[t] = [data[i][t] for i in data]
+        for i in set(x[t]):
+            if TAXON.index(t) == 0 or i not in x[TAXON[TAXON.index(t)-1]]:
+                counts[i] = x[t].count(i)
+        taxon_n[t] = len(counts)
+    return taxon_n
+
+
+class TestEngine(unittest.TestCase):
+    """The integer-coded engine must reproduce ATDmean/ATDvariance."""
+
+    def setUp(self):
+        self.population = build_population()
+        self.coef = build_coef()
+        self.encoded = EncodedPopulation(self.population, TAXON)
+
+    def test_encoding_shape(self):
+        """One code column per level, one row per species."""
+        self.assertEqual(len(self.encoded), len(self.population))
+        self.assertEqual(len(self.encoded.codes), len(TAXON))
+        for column, names in zip(self.encoded.codes, self.encoded.names):
+            self.assertEqual(len(column), len(self.population))
+            self.assertEqual(max(column) + 1, len(names))
+
+    def test_matches_reference(self):
+        """AvTD, VarTD and taxonN agree with the original loops on random samples."""
+        rng = random.Random(11)
+        species = list(self.population)
+        for size in (2, 5, 17, 60, len(species)):
+            sample = rng.sample(species, size)
+            atd, vtd, taxon_n = atd_statistics(self.encoded, sample, self.coef)
+            ref_atd, ref_vtd, ref_n, ref_counts = reference_atd(self.population, sample,
+                                                                self.coef)
+            self.assertAlmostEqual(atd, ref_atd, places=9)
+            self.assertAlmostEqual(vtd, ref_vtd, places=9)
+            self.assertEqual(taxon_n, ref_n)
+            rows = self.encoded.rows(sample)
+            self.assertEqual(self.encoded.taxon_counts(rows), ref_counts)
+
+    def test_single_taxon(self):
+        """Species that never differ have no pairwise differences."""
+        population = {'a': dict.fromkeys(TAXON, 'x'), 'b': dict.fromkeys(TAXON, 'x')}
+        encoded = EncodedPopulation(population, TAXON)
+        taxon_n = pairwise_differences(encoded, encoded.rows(['a', 'b']))
+        self.assertEqual(set(taxon_n.values()), {0})
+
+
+class TestFunnel(unittest.TestCase):
+    """The parallel funnel is reproducible and reduces permutations like Funnel."""
+
+    def setUp(self):
+        self.encoded = EncodedPopulation(build_population(), TAXON)
+        self.coef = build_coef()
+
+    def test_reproducible_for_seed(self):
+        """Same seed and chunking give the same table whatever the worker count."""
+        rows = parallel_funnel(self.encoded, self.coef, 40, 5, 8, seed=3, workers=1)
+        self.assertEqual(rows, parallel_funnel(self.encoded, self.coef, 40, 5, 8,
+                                               seed=3, workers=3))
+        chunked = parallel_funnel(self.encoded, self.coef, 40, 5, 8, seed=3, workers=1,
+                                  chunk_size=15)
+        self.assertEqual(chunked, parallel_funnel(self.encoded, self.coef, 40, 5, 8,
+                                                  seed=3, workers=2, chunk_size=15))
+        self.assertEqual([row[0] for row in rows], [5, 6, 7, 8])
+
+    def test_confidence_row(self):
+        """Percentiles are picked from the sorted permutations at 5% and 95%."""
+        for mode in ('sort', 'select'):
+            avtd = make_summary(mode, 100)
+            vartd = make_summary(mode, 100)
+            for i in range(100):
+                avtd.add(float(100 - i))
+                vartd.add(float(i))
+            row = confidence_row(10, avtd, vartd)
+            self.assertEqual(row, (10, 6.0, 50.5, 96.0, 100.0, 0.0, 5.0, 49.5, 95.0))
+
+    def test_select_matches_sort(self):
+        """Bounded exact selection gives the same table as keeping every value."""
+        rows = parallel_funnel(self.encoded, self.coef, 60, 5, 7, seed=1, workers=2,
+                               chunk_size=25)
+        self.assertEqual(rows, parallel_funnel(self.encoded, self.coef, 60, 5, 7, seed=1,
+                                               workers=2, chunk_size=25, quantiles='select'))
+
+    def test_sketch_is_bounded(self):
+        """The sketch keeps at most size values but exact mean, min and max."""
+        rng = random.Random(5)
+        sketch = SketchSummary(size=500, seed=2)
+        values = [rng.random() for _ in range(20000)]
+        for value in values:
+            sketch.add(value)
+        self.assertEqual(len(sketch.reservoir), 500)
+        self.assertEqual((sketch.minimum, sketch.maximum), (min(values), max(values)))
+        self.assertAlmostEqual(sketch.mean(), sum(values) / len(values))
+        self.assertAlmostEqual(sketch.percentile(.95), 0.95, delta=0.03)
+
+    def test_summary_needs_percentile(self):
+        """A summary without percentile cannot be built at all."""
+
+        class Partial(Summary):
+            """Counts but has no percentile."""
+
+        self.assertRaises(TypeError, Partial)
+
+    def test_unknown_mode(self):
+        """Quantile modes other than sort, select and sketch are rejected."""
+        self.assertRaises(ValueError, make_summary, 'median', 10)
+
+
+def population_lines(population):
+    """Write a population dict back out as PhyRe master list lines."""
+
+    lines = ['Taxon: %s\n' % ' '.join(TAXON)]
+    for species, levels in population.items():
+        lines.append('%s %s\n' % (species, ' '.join(levels[t] for t in TAXON)))
+    return lines
+
+
+class TestLibrary(unittest.TestCase):
+    """The importable API works on a Population without module state."""
+
+    def setUp(self):
+        self.data = build_population()
+        self.population = parse_population(population_lines(self.data))
+        self.population.coef = build_coef()
+
+    def test_parse(self):
+        """Master list lines round-trip into the population dict."""
+        self.assertEqual(self.population.taxon, TAXON)
+        self.assertEqual(self.population.data, self.data)
+        self.assertEqual(self.population.duplicates, [])
+
+    def test_missing_levels(self):
+        """With missing == 'y' a '/' takes the name of the level above."""
+        lines = ['Taxon: A B C\n', 'x a1 / c1\n', 'x a1 b1 c2\n']
+        population = parse_population(lines, missing='y')
+        self.assertEqual(population.data['x'], {'A': 'a1', 'B': 'b1', 'C': 'c2'})
+        self.assertEqual(population.duplicates, ['x'])
+        population = parse_population(lines[:2], missing='y')
+        self.assertEqual(population.data['x']['B'], 'a1')
+
+    def test_atd_matches_reference(self):
+        """ATDmean/ATDvariance agree with the PhyRe.py loops."""
+        sample = read_sample(self.population, ['sp%d\n' % i for i in range(0, 200, 3)])
+        atd, taxon_n, taxa = ATDmean(self.population, sample)
+        vtd = ATDvariance(self.population, taxon_n, sample, atd)
+        ref_atd, ref_vtd, ref_n, ref_counts = reference_atd(self.data, list(sample),
+                                                            self.population.coef)
+        self.assertAlmostEqual(atd, ref_atd)
+        self.assertAlmostEqual(vtd, ref_vtd)
+        self.assertEqual((taxon_n, taxa), (ref_n, ref_counts))
+
+    def test_euler_leaves_taxon_alone(self):
+        """euler no longer reverses the shared level list."""
+        sample = list(self.data)[:50]
+        atd, _, taxa = ATDmean(self.population, sample)
+        result = euler(self.population, sample, atd, taxa)
+        self.assertEqual(self.population.taxon, TAXON)
+        self.assertLessEqual(result['TDmin'], atd)
+        self.assertLessEqual(atd, result['TDmax'])
+
+    def test_euler_matches_reference(self):
+        """Counting group sizes gives the same TDmin/TDmax/EI as the membership lists."""
+        rng = random.Random(4)
+        for size in (10, 41, 120, 200):
+            sample = rng.sample(list(self.data), size)
+            atd, _, taxa = ATDmean(self.population, sample)
+            result = euler(self.population, sample, atd, taxa)
+            expected = reference_euler(sample, atd, taxa, self.population.coef)
+            for key in ('EI', 'TDmin', 'TDmax'):
+                self.assertAlmostEqual(result[key], expected[key], places=9)
+
+    def test_serial_funnel_seeded(self):
+        """A seeded serial Funnel is repeatable."""
+        rows = Funnel(self.population, 30, 5, 6, seed=9)
+        self.assertEqual(rows, Funnel(self.population, 30, 5, 6, seed=9))
+        self.assertEqual(len(rows), 2)
+
+    def test_path_length_matches_reference(self):
+        """Distinct-name sets count the same taxa as the list scans."""
+        lines = population_lines(self.data)
+        lines.append('shared P0 P0 P0C1O1 P0C1O1 P0C1O1G2\n')
+        population = parse_population(lines)
+        coef, taxon_n, path_lengths = PathLength(population)
+        self.assertEqual(taxon_n, reference_path_length(population.data))
+        self.assertAlmostEqual(sum(path_lengths.values()), 100.0)
+        self.assertAlmostEqual(coef[TAXON[-1]], path_lengths[TAXON[-1]])
+
+    def test_load_population(self):
+        """load_population reads a file and derives path lengths summing to 100."""
+        with tempfile.TemporaryDirectory() as folder:
+            popfile = os.path.join(folder, 'pop.txt')
+            with open(popfile, 'w') as output:
+                output.writelines(population_lines(self.data))
+            population = load_population(popfile)
+        self.assertAlmostEqual(sum(population.path_lengths.values()), 100.0)
+        self.assertAlmostEqual(population.coef[TAXON[0]], 100.0)
+        self.assertEqual(set(population.taxon_n), set(TAXON))
+
+
+class TestCache(unittest.TestCase):
+    """load_population reuses the compiled master list while the source is unchanged."""
+
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.popfile = os.path.join(self.folder.name, 'pop.txt')
+        with open(self.popfile, 'w') as output:
+            output.writelines(population_lines(build_population()))
+
+    def tearDown(self):
+        self.folder.cleanup()
+
+    def test_round_trip(self):
+        """The cached population gives the same numbers as the parsed one."""
+        parsed = load_population(self.popfile)
+        self.assertTrue(os.path.exists(cache_path(self.popfile)))
+        cached = load_population(self.popfile)
+        self.assertIsInstance(cached.encoded.codes[0], memoryview)
+        self.assertEqual(cached.coef, parsed.coef)
+        self.assertEqual(cached.taxon_n, parsed.taxon_n)
+        self.assertEqual(dict(cached.data), parsed.data)
+        sample = parsed.species[::4]
+        self.assertEqual(ATDmean(cached, sample), ATDmean(parsed, sample))
+        self.assertEqual(Funnel(cached, 20, 5, 6, seed=1), Funnel(parsed, 20, 5, 6, seed=1))
+
+    def test_stale_cache(self):
+        """Editing the master list invalidates the cache; touching it does not."""
+        load_population(self.popfile)
+        stat = os.stat(self.popfile)
+        os.utime(self.popfile, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+        self.assertIsNotNone(read_cache(self.popfile))
+        with unittest.mock.patch('hashlib.sha1') as sha1:
+            self.assertIsNotNone(read_cache(self.popfile))
+        sha1.assert_not_called()
+        self.assertIsNone(read_cache(self.popfile, missing='y'))
+        with open(self.popfile, 'a') as output:
+            output.write('extra P0 P0C0 P0C0O0 P0C0O0F0 P0C0O0F0G0\n')
+        self.assertIsNone(read_cache(self.popfile))
+        self.assertIn('extra', load_population(self.popfile))
+
+    def test_damaged_cache(self):
+        """A truncated or malformed cache is ignored and the source parsed again."""
+        parsed = load_population(self.popfile)
+        target = cache_path(self.popfile)
+        with open(target, 'rb') as source:
+            compiled = source.read()
+        damaged = [compiled[:20], compiled[:-2], compiled[:-4], compiled + b'\0' * 4,
+                   compiled.replace(b'"taxon_n"', b'"taxon_x"', 1)]
+        for data in damaged:
+            with open(target, 'wb') as output:
+                output.write(data)
+            self.assertIsNone(read_cache(self.popfile))
+            self.assertEqual(load_population(self.popfile).coef, parsed.coef)
+            self.assertIsNotNone(read_cache(self.popfile))
+
+    def test_pickle(self):
+        """Cached columns are copied out when sent to a worker process."""
+        load_population(self.popfile)
+        encoded = load_population(self.popfile).encoded
+        copy = pickle.loads(pickle.dumps(encoded))
+        self.assertEqual([list(column) for column in copy.codes],
+                         [list(column) for column in encoded.codes])
+
+    def test_no_cache(self):
+        """cache=False neither writes nor reads the compiled file."""
+        load_population(self.popfile, cache=False)
+        self.assertFalse(os.path.exists(cache_path(self.popfile)))
+
+
+class TestAccumulator(unittest.TestCase):
+    """Adding and removing single species keeps AvTD/VarTD current."""
+
+    def setUp(self):
+        self.population = parse_population(population_lines(build_population()))
+        self.population.coef = build_coef()
+
+    def assert_matches(self, accumulator):
+        """Accumulator agrees with a from-scratch ATDmean/ATDvariance."""
+        sample = sorted(accumulator.members)
+        atd, taxon_n, _ = ATDmean(self.population, sample)
+        self.assertEqual(accumulator.taxon_n, taxon_n)
+        self.assertAlmostEqual(accumulator.atd, atd, places=9)
+        self.assertAlmostEqual(accumulator.vtd,
+                               ATDvariance(self.population, taxon_n, sample, atd), places=9)
+
+    def test_random_walk(self):
+        """A random sequence of adds and removes matches recomputation at every step."""
+        rng = random.Random(12)
+        species = self.population.species
+        accumulator = DistinctnessAccumulator(self.population, species[:10])
+        self.assert_matches(accumulator)
+        for _ in range(200):
+            if len(accumulator) > 3 and rng.random() < 0.4:
+                accumulator.remove_species(rng.choice(sorted(accumulator.members)))
+            else:
+                candidate = rng.choice(species)
+                if candidate not in accumulator:
+                    accumulator.add_species(candidate)
+            self.assert_matches(accumulator)
+
+    def test_membership_errors(self):
+        """Species are in the sample at most once."""
+        accumulator = DistinctnessAccumulator(self.population, ['sp1', 'sp2'])
+        self.assertRaises(ValueError, accumulator.add_species, 'sp1')
+        self.assertRaises(KeyError, accumulator.remove_species, 'sp3')
+
+
+class TestBatch(unittest.TestCase):
+    """Sample files are analysed against one population, serially or in a pool."""
+
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.population = parse_population(population_lines(build_population()))
+        self.population.coef = build_coef()
+        self.files = []
+        for number in range(5):
+            filename = os.path.join(self.folder.name, 's%d.txt' % number)
+            with open(filename, 'w') as output:
+                output.writelines('sp%d\n' % i for i in range(number, 200, 7 + number))
+            self.files.append(filename)
+        self.files.append(os.path.join(self.folder.name, 'missing.txt'))
+
+    def tearDown(self):
+        self.folder.cleanup()
+
+    def test_parallel_matches_serial(self):
+        """The pool returns the same results, in whatever order they finish."""
+        serial = {name: (result, error) for name, result, _, error
+                  in run_batch(self.population, self.files)}
+        parallel = {name: (result, error) for name, result, _, error
+                    in run_batch(self.population, self.files, workers=3)}
+        self.assertEqual(serial, parallel)
+        self.assertEqual(list(serial), self.files)
+
+    def test_errors_do_not_stop_batch(self):
+        """A missing sample file is reported and the rest still run."""
+        outcomes = list(run_batch(self.population, self.files))
+        _, result, seconds, error = outcomes[-1]
+        self.assertIsNone(result)
+        self.assertIn('FileNotFoundError', error)
+        self.assertGreaterEqual(seconds, 0)
+        self.assertTrue(all(outcome[1] for outcome in outcomes[:-1]))
+
+
+class TestBenchmark(unittest.TestCase):
+    """The benchmark harness runs end to end and flags slowdowns."""
+
+    def test_small_run(self):
+        """A tiny synthetic population is timed at every stage."""
+        with tempfile.TemporaryDirectory() as folder:
+            record = bench_population(folder, 60, 4, 3, 10, 5, repeat=1)
+        self.assertEqual(set(record['seconds']), {'parse', 'cached_load', 'path_length',
+                                                  'atd_mean', 'euler', 'funnel'})
+        self.assertEqual(len(record['taxa']), 4)
+
+    def test_regressions(self):
+        """Only stages slower than tolerance times the baseline are reported."""
+        old = [{'species': 10, 'levels': 5, 'branching': 4,
+                'seconds': {'parse': 1.0, 'funnel': 1.0}}]
+        new = [{'species': 10, 'levels': 5, 'branching': 4,
+                'seconds': {'parse': 1.2, 'funnel': 2.0}},
+               {'species': 99, 'levels': 5, 'branching': 4, 'seconds': {'parse': 9.0}}]
+        slower = regressions(new, old, 1.5)
+        self.assertEqual(len(slower), 1)
+        self.assertTrue(slower[0].startswith('funnel at 10 species'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,222 @@
+"""
+Performance regression harness for the analyze() implementations
+
+    python benchmark_analyze.py --sizes 10000 100000 1000000 -o bench.json
+    python benchmark_analyze.py --sizes 10000 100000 1000000 --baseline bench.json
+    python benchmark_analyze.py --file data/exercise.csv
+
+Every registered implementation is run on seeded generate_records files
+of each size (or on --file). Each run happens in a fresh process, so its
+peak RSS is its own. The report is JSON, one record per implementation and
+size, with wall time, rows/second and peak RSS.
+
+The exit status is 1 if the implementations disagree on year_count or
+found for any file. It is also 1 if, with --baseline, a guarded
+implementation is slower than tolerance times its time in the earlier
+report.
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import multiprocessing
+import os
+import resource
+import sys
+import tempfile
+import time
+
+import generate_records
+import good_perf
+import poor_perf
+
+IMPLEMENTATIONS = {}
+
+
+def register_implementation(name, analyze):
+    """Add an analyze(filename) -> (start, end, year_count, found) to the harness."""
+
+    IMPLEMENTATIONS[name] = analyze
+
+
+register_implementation('poor_perf', poor_perf.analyze)
+register_implementation('good_perf', good_perf.analyze)
+register_implementation('good_perf_mmap', good_perf.analyze_mmap)
+register_implementation('good_perf_parallel', good_perf.analyze_parallel)
+
+
+def peak_rss_kb():
+    """Peak resident set size of this process and its finished children, in KB.
+
+    Linux carries ru_maxrss over an exec, so a spawned process would report
+    its parent's peak; VmHWM in /proc is its own and is used where it exists."""
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    try:
+        with open('/proc/self/status') as status:
+            for line in status:
+                if line.startswith('VmHWM:'):
+                    peak = int(line.split()[1])
+    except OSError:
+        pass
+    return max(peak, resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+
+
+def measure(name, filename, repeat=3):
+    """Best wall time, peak RSS and result of repeat runs of one implementation."""
+
+    analyze = IMPLEMENTATIONS[name]
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            _, _, year_count, found = analyze(filename)
+        best = min(best, time.perf_counter() - started)
+    return {'seconds': best, 'peak_rss_kb': peak_rss_kb(),
+            'year_count': year_count, 'found': found}
+
+
+def _measure_child(sender, name, filename, repeat):
+    sender.send(measure(name, filename, repeat))
+
+
+def measure_isolated(name, filename, repeat=3):
+    """measure() in a freshly started process, which may start pools of its own."""
+
+    context = multiprocessing.get_context('spawn')
+    receiver, sender = context.Pipe(duplex=False)
+    process = context.Process(target=_measure_child, args=(sender, name, filename, repeat))
+    process.start()
+    sender.close()
+    try:
+        result = receiver.recv()
+    except EOFError:
+        result = None
+    process.join()
+    if result is None:
+        raise RuntimeError('%s failed on %s' % (name, filename))
+    return result
+
+
+def count_rows(filename):
+    """Lines in filename, the last one counted without a trailing newline."""
+
+    rows = 0
+    last = b'\n'
+    with open(filename, 'rb') as csvfile:
+        for block in iter(lambda: csvfile.read(1 << 20), b''):
+            rows += block.count(b'\n')
+            last = block[-1:]
+    return rows + (last != b'\n')
+
+
+def bench_file(filename, names, repeat=3, isolated=True):
+    """Records of every named implementation on one file, and the names
+    whose year_count or found differ from the first one's."""
+
+    rows = count_rows(filename)
+    run = measure_isolated if isolated else measure
+    records = []
+    for name in names:
+        result = run(name, filename, repeat)
+        records.append({'implementation': name, 'rows': rows,
+                        'seconds': result['seconds'],
+                        'rows_per_second': rows / result['seconds'] if result['seconds'] else 0,
+                        'peak_rss_kb': result['peak_rss_kb'],
+                        'year_count': result['year_count'], 'found': result['found']})
+    expected = records[0]
+    mismatched = [record['implementation'] for record in records[1:]
+                  if (record['year_count'], record['found'])
+                  != (expected['year_count'], expected['found'])]
+    return records, mismatched
+
+
+def bench_sizes(sizes, names, repeat=3, seed=1, isolated=True):
+    """bench_file on a seeded generated file of every size."""
+
+    report = []
+    mismatches = []
+    with tempfile.TemporaryDirectory() as folder:
+        for rows in sizes:
+            filename = os.path.join(folder, 'exercise_%d.csv' % rows)
+            generate_records.generate_records(filename, rows, seed)
+            records, mismatched = bench_file(filename, names, repeat, isolated)
+            os.remove(filename)
+            report.extend(records)
+            mismatches.extend('%s at %d rows' % (name, rows) for name in mismatched)
+    return report, mismatches
+
+
+def regressions(report, baseline, tolerance, guarded):
+    """'implementation at rows' entries of guarded implementations slower
+    than tolerance times the baseline."""
+
+    previous = {(record['implementation'], record['rows']): record for record in baseline}
+    slower = []
+    for record in report:
+        old = previous.get((record['implementation'], record['rows']))
+        if record['implementation'] not in guarded or old is None:
+            continue
+        if record['seconds'] > old['seconds'] * tolerance:
+            slower.append('%s at %d rows: %.4f s (baseline %.4f s)'
+                          % (record['implementation'], record['rows'], record['seconds'],
+                             old['seconds']))
+    return slower
+
+
+def parse_cmd_arguments(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the analyze() implementations.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 1000000],
+                        help='rows in each generated file')
+    parser.add_argument('--file', help='time this CSV file instead of generated ones')
+    parser.add_argument('--implementations', nargs='+', choices=sorted(IMPLEMENTATIONS),
+                        help='implementations to run, all by default')
+    parser.add_argument('--repeat', type=int, default=3, help='runs per timing, best is kept')
+    parser.add_argument('--seed', default=1, help='seed of the generated files')
+    parser.add_argument('-o', '--output', help='write the JSON report here instead of stdout')
+    parser.add_argument('--baseline', help='earlier JSON report to compare against')
+    parser.add_argument('--tolerance', type=float, default=1.5,
+                        help='allowed slowdown factor against the baseline')
+    parser.add_argument('--guard', nargs='+',
+                        help='implementations that must not regress, all but poor_perf '
+                             'by default')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    """Run the harness and return the exit status."""
+
+    args = parse_cmd_arguments(argv)
+    names = args.implementations or list(IMPLEMENTATIONS)
+    if args.file:
+        report, mismatched = bench_file(args.file, names, args.repeat)
+        mismatches = ['%s on %s' % (name, args.file) for name in mismatched]
+    else:
+        report, mismatches = bench_sizes(args.sizes, names, args.repeat, args.seed)
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as output:
+            output.write(text + '\n')
+    else:
+        print(text)
+    for record in report:
+        sys.stderr.write('%-18s %10d rows %9.3f s %12.0f rows/s %8d KB\n'
+                         % (record['implementation'], record['rows'], record['seconds'],
+                            record['rows_per_second'], record['peak_rss_kb']))
+
+    slower = []
+    if args.baseline:
+        guarded = args.guard or [name for name in IMPLEMENTATIONS if name != 'poor_perf']
+        with open(args.baseline) as baseline:
+            slower = regressions(report, json.load(baseline), args.tolerance, guarded)
+    for line in mismatches:
+        sys.stderr.write('different result: %s\n' % line)
+    for line in slower:
+        sys.stderr.write('slower: %s\n' % line)
+    return 1 if mismatches or slower else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
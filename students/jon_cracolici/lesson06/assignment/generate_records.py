@@ -0,0 +1,87 @@
+"""
+Generate exercise.csv style benchmark data in bulk
+
+    python generate_records.py 10000000 -o data/big.csv --seed 1 --workers 4
+
+Each row is a uuid4, four consecutive ints starting at the row number, an
+mm/dd/yyyy date from 2010 to 2018 and a tag that is empty or 'ao'. Rows are
+made a chunk at a time: one randbytes call supplies every uuid of the chunk,
+random.choices picks all dates and tags, and the chunk is written in a
+single call. Chunk n is seeded from (seed, n), so a seed gives the same
+file whatever the number of workers.
+"""
+
+import argparse
+import datetime
+import os
+import random
+from multiprocessing import Pool
+
+CHUNK_ROWS = 100000
+FIRST_DAY = datetime.date(2010, 1, 1)
+LAST_DAY = datetime.date(2018, 12, 31)
+TAGS = ('', 'ao')
+DATES = [(FIRST_DAY + datetime.timedelta(days=day)).strftime('%m/%d/%Y')
+         for day in range((LAST_DAY - FIRST_DAY).days + 1)]
+ROW = '%s-%s-4%s-%s%s-%s,%d,%d,%d,%d,%s,%s\n'
+
+
+def generate_chunk(task):
+    """Text of rows first..first + count - 1 (numbered from 1) of chunk n."""
+
+    seed, chunk, first, count = task
+    rng = random.Random('%s:%d' % (seed, chunk))
+    hexes = rng.randbytes(16 * count).hex()
+    variants = rng.choices('89ab', k=count)
+    dates = rng.choices(DATES, k=count)
+    tags = rng.choices(TAGS, k=count)
+    rows = []
+    for row in range(count):
+        uuid = hexes[32 * row:32 * row + 32]
+        number = first + row
+        rows.append(ROW % (uuid[:8], uuid[8:12], uuid[13:16], variants[row], uuid[17:20],
+                           uuid[20:], number, number + 1, number + 2, number + 3,
+                           dates[row], tags[row]))
+    return ''.join(rows)
+
+
+def tasks(rows, seed, chunk_rows=CHUNK_ROWS):
+    """(seed, chunk, first row, rows) of every chunk."""
+
+    return [(seed, chunk, first + 1, min(chunk_rows, rows - first))
+            for chunk, first in enumerate(range(0, rows, chunk_rows))]
+
+
+def generate_records(filename, rows, seed=None, workers=1, chunk_rows=CHUNK_ROWS):
+    """Write rows generated rows to filename and return the seed used."""
+
+    if seed is None:
+        seed = int.from_bytes(os.urandom(8), 'big')
+    chunks = tasks(rows, seed, chunk_rows)
+    with open(filename, 'w', newline='') as csvfile:
+        if workers > 1:
+            with Pool(workers) as pool:
+                csvfile.writelines(pool.imap(generate_chunk, chunks))
+        else:
+            csvfile.writelines(map(generate_chunk, chunks))
+    return seed
+
+
+def parse_cmd_arguments():
+    parser = argparse.ArgumentParser(description='Generate exercise.csv style rows.')
+    parser.add_argument('rows', type=int, help='number of rows')
+    parser.add_argument('-o', '--output', required=True, help='CSV file to write')
+    parser.add_argument('-s', '--seed', help='seed for a reproducible file')
+    parser.add_argument('-w', '--workers', type=int, default=1,
+                        help='generate chunks in N processes')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_cmd_arguments()
+    seed = generate_records(args.output, args.rows, args.seed, args.workers)
+    print(f"{args.rows} rows written to {args.output} (seed {seed})")
+
+
+if __name__ == "__main__":
+    main()
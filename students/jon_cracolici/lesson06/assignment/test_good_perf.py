@@ -0,0 +1,274 @@
+"""Unit Test Module for the exercise.csv analyzers."""
+
+import csv
+import os
+import sys
+import tempfile
+DIR_PATH = os.path.dirname(os.path.realpath(__file__))
+sys.path.append(DIR_PATH)
+
+import unittest
+import uuid
+import benchmark_analyze
+import generate_records
+import good_perf
+
+EXERCISE = os.path.join(DIR_PATH, 'data', 'exercise.csv')
+
+
+def reference(filename):
+    """Year counts and 'ao' count the slow, obvious way."""
+
+    year_count = dict.fromkeys(good_perf.YEARS, 0)
+    found = 0
+    with open(filename, newline='') as csvfile:
+        for row in csv.reader(csvfile):
+            if row[5][6:] in year_count:
+                year_count[row[5][6:]] += 1
+            if 'ao' in row[6]:
+                found += 1
+    return year_count, found
+
+
+class TestAnalyzer(unittest.TestCase):
+    """The single pass analyzer and its metrics."""
+
+    def test_analyze(self):
+        """analyze returns poor_perf's tuple with correct counts."""
+        start, end, year_count, found = good_perf.analyze(EXERCISE)
+        self.assertLessEqual(start, end)
+        self.assertEqual((year_count, found), reference(EXERCISE))
+        self.assertEqual(year_count['2018'], 2)
+        self.assertEqual(found, 3)
+
+    def test_registered_metrics(self):
+        """Any mix of registered metrics is gathered in one run."""
+        metrics = good_perf.build_metrics({
+            'years': ('year_count', {'years': ('2010', '2011')}),
+            'uuid_bc': ('substring', {'substring': 'bc', 'column': 0}),
+            'odd': ('predicate', {'predicate': lambda row: int(row[1]) % 2}),
+        })
+        results = good_perf.Analyzer(metrics).run(EXERCISE)
+        self.assertEqual(results, {'years': {'2010': 3, '2011': 2},
+                                   'uuid_bc': 3, 'odd': 5})
+
+    def test_single_metric(self):
+        """A lone metric sees every row too."""
+        metrics = good_perf.build_metrics({'rows': ('predicate', {'predicate': bool})})
+        self.assertEqual(good_perf.Analyzer(metrics).run(EXERCISE), {'rows': 10})
+
+    def test_register(self):
+        """New metrics can be registered and built by name."""
+
+        @good_perf.register_metric('last_tag')
+        class LastTag(good_perf.Metric):
+            """Tag of the last row."""
+
+            def __init__(self):
+                self.tag = None
+
+            def update(self, row):
+                self.tag = row[good_perf.TAG_COLUMN]
+
+            def result(self):
+                return self.tag
+
+        try:
+            metrics = good_perf.build_metrics({'tag': ('last_tag', {})})
+            self.assertEqual(good_perf.Analyzer(metrics).run(EXERCISE), {'tag': ''})
+        finally:
+            del good_perf.METRICS['last_tag']
+
+    def test_incomplete_metric(self):
+        """A metric missing update or result fails when built, not mid-run."""
+
+        class NoResult(good_perf.Metric):
+            """Updates but never reports."""
+
+            def update(self, row):
+                pass
+
+        self.assertRaises(TypeError, NoResult)
+
+
+class TestScanner(unittest.TestCase):
+    """The mmap byte scanner agrees with csv.reader."""
+
+    LINES = [
+        '5df44a54-8cca-4928-bc53-caabb23cf329,1,2,3,4,05/26/2015,',
+        'bc337622-119c-445d-9282-e4b980201c03,2,3,4,5,08/02/2018,aoao',
+        'f7a66f58-cfb2-459b-aca7-7eebd6f5417d,3,4,5,6,04/26/2017,"ao, quoted"',
+        '5536f39e-9bdc-4bd6-8adb-1de901b5d68a,4,5,6,7,10/19/2013,"a,o"',
+        '23e918c3-19c4-4e78-9f1d-65041e22e6e8,5,6,7,8,01/27/2018,xao/2014',
+        '8f9ca0ad-cfce-4394-9114-17c6cf71965e,6,7,8,9,03/14/2012,bao',
+    ]
+    QUOTED_NEWLINES = [
+        '5df44a54-8cca-4928-bc53-caabb23cf329,1,2,3,4,05/26/2015,"x\nao"',
+        'bc337622-119c-445d-9282-e4b980201c03,2,3,4,5,08/02/2018,"a\n\nb\nao/2014,"',
+        '8f9ca0ad-cfce-4394-9114-17c6cf71965e,6,7,8,9,03/14/2012,"x\ny"',
+    ]
+
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.folder.cleanup()
+
+    def write(self, lines, ending='\n'):
+        """A CSV file of the given lines."""
+        filename = os.path.join(self.folder.name, 'exercise.csv')
+        with open(filename, 'w', newline='') as csvfile:
+            csvfile.write('\n'.join(lines) + ending)
+        return filename
+
+    def test_exercise(self):
+        """The shipped file scans to analyze's counts."""
+        self.assertEqual(good_perf.analyze_mmap(EXERCISE)[2:], good_perf.analyze(EXERCISE)[2:])
+
+    def test_quoted_and_odd_tags(self):
+        """Quoted lines, repeated substrings and dates in tags are counted right."""
+        for ending in ('\n', ''):
+            filename = self.write(self.LINES * 50, ending)
+            expected = reference(filename)
+            self.assertEqual(expected[1], 200)
+            for block_size in (1, 100, 1000, good_perf.SCAN_BLOCK):
+                self.assertEqual(good_perf.scan_file(filename, block_size=block_size), expected)
+
+    def test_quoted_newlines(self):
+        """Blocks never end on a newline inside a quoted tag."""
+        lines = self.QUOTED_NEWLINES + self.LINES
+        for ending in ('\n', ''):
+            filename = self.write(lines * 10, ending)
+            expected = reference(filename)
+            self.assertEqual(good_perf.analyze(filename)[2:], expected)
+            for block_size in (1, 24, 100, 1000, good_perf.SCAN_BLOCK):
+                self.assertEqual(good_perf.scan_file(filename, block_size=block_size), expected)
+
+    def test_empty(self):
+        """An empty file has nothing to count."""
+        filename = self.write([], '')
+        self.assertEqual(good_perf.scan_file(filename),
+                         (dict.fromkeys(good_perf.YEARS, 0), 0))
+
+    def test_parallel(self):
+        """Chunks scanned in a process pool merge to the same counts."""
+        for ending in ('\n', ''):
+            filename = self.write(self.LINES * 50, ending)
+            expected = reference(filename)
+            for workers, chunks in ((1, None), (2, 3), (3, 1000)):
+                self.assertEqual(good_perf.scan_parallel(filename, workers, chunks), expected)
+        self.assertEqual(good_perf.analyze_parallel(EXERCISE, 2)[2:], reference(EXERCISE))
+
+    def test_chunk_ranges(self):
+        """Chunks cover the file back to back and end on a newline."""
+        filename = self.write(self.LINES * 20)
+        with open(filename, 'rb') as csvfile:
+            data = csvfile.read()
+        for chunks in (1, 7, 1000):
+            ranges = good_perf.chunk_ranges(filename, chunks)
+            self.assertLessEqual(len(ranges), chunks)
+            self.assertEqual(b''.join(data[start:end] for start, end in ranges), data)
+            self.assertTrue(all(data[end - 1:end] == b'\n' for _, end in ranges))
+        self.assertEqual(good_perf.chunk_ranges(self.write([], ''), 4), [])
+
+    def test_quoted_chunks(self):
+        """Chunk boundaries skip newlines inside quoted tags."""
+        for ending in ('\n', ''):
+            filename = self.write(self.QUOTED_NEWLINES + self.LINES, ending)
+            with open(filename, 'rb') as csvfile:
+                data = csvfile.read()
+            expected = reference(filename)
+            for chunks in (3, 7, 1000):
+                ranges = good_perf.chunk_ranges(filename, chunks)
+                self.assertEqual(b''.join(data[start:end] for start, end in ranges), data)
+                self.assertTrue(all(data.count(b'"', start, end) % 2 == 0
+                                    for start, end in ranges))
+                self.assertEqual(good_perf.scan_parallel(filename, 2, chunks), expected)
+
+
+class TestGenerator(unittest.TestCase):
+    """Bulk generated rows are valid and reproducible."""
+
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.folder.cleanup()
+
+    def generate(self, name, rows, **kwargs):
+        """Text of a generated file."""
+        filename = os.path.join(self.folder.name, name)
+        generate_records.generate_records(filename, rows, **kwargs)
+        with open(filename, newline='') as csvfile:
+            return csvfile.read()
+
+    def test_rows(self):
+        """Every row has the exercise.csv layout."""
+        text = self.generate('rows.csv', 250, seed=3, chunk_rows=100)
+        rows = list(csv.reader(text.splitlines()))
+        self.assertEqual(len(rows), 250)
+        for number, row in enumerate(rows, 1):
+            self.assertEqual(len(row), 7)
+            self.assertEqual(uuid.UUID(row[0]).version, 4)
+            self.assertEqual(str(uuid.UUID(row[0])), row[0])
+            self.assertEqual(row[1:5], [str(number + offset) for offset in range(4)])
+            self.assertIn(row[6], generate_records.TAGS)
+            self.assertTrue('2010' <= row[5][6:] <= '2018')
+        self.assertEqual(good_perf.scan_file(os.path.join(self.folder.name, 'rows.csv')),
+                         reference(os.path.join(self.folder.name, 'rows.csv')))
+
+    def test_seed(self):
+        """A seed gives the same file serially or in parallel; no seed varies."""
+        serial = self.generate('serial.csv', 1000, seed=7, chunk_rows=128)
+        parallel = self.generate('parallel.csv', 1000, seed=7, workers=3, chunk_rows=128)
+        self.assertEqual(serial, parallel)
+        self.assertNotEqual(self.generate('other.csv', 1000, seed=8, chunk_rows=128), serial)
+        self.assertEqual(self.generate('empty.csv', 0, seed=7), '')
+
+
+class TestHarness(unittest.TestCase):
+    """The benchmark harness catches wrong results and slowdowns."""
+
+    def test_agree(self):
+        """Every registered implementation gives the same result."""
+        report, mismatches = benchmark_analyze.bench_sizes(
+            [500], list(benchmark_analyze.IMPLEMENTATIONS), repeat=1, isolated=False)
+        self.assertEqual(mismatches, [])
+        self.assertEqual({record['rows'] for record in report}, {500})
+
+    def test_mismatch(self):
+        """An implementation with a different result is reported."""
+
+        def wrong(filename):
+            start, end, year_count, found = good_perf.analyze(filename)
+            return start, end, year_count, found + 1
+
+        benchmark_analyze.register_implementation('wrong', wrong)
+        try:
+            _, mismatches = benchmark_analyze.bench_sizes(
+                [100], ['good_perf', 'wrong'], repeat=1, isolated=False)
+        finally:
+            del benchmark_analyze.IMPLEMENTATIONS['wrong']
+        self.assertEqual(mismatches, ['wrong at 100 rows'])
+
+    def test_isolated(self):
+        """A run in its own process reports its result and peak RSS."""
+        result = benchmark_analyze.measure_isolated('good_perf_mmap', EXERCISE, repeat=1)
+        self.assertEqual((result['year_count'], result['found']), reference(EXERCISE))
+        self.assertGreater(result['peak_rss_kb'], 0)
+
+    def test_regressions(self):
+        """Only guarded implementations past the tolerance are flagged."""
+        baseline = [{'implementation': 'good_perf', 'rows': 10, 'seconds': 1.0},
+                    {'implementation': 'poor_perf', 'rows': 10, 'seconds': 1.0}]
+        report = [{'implementation': 'good_perf', 'rows': 10, 'seconds': 2.0},
+                  {'implementation': 'poor_perf', 'rows': 10, 'seconds': 2.0},
+                  {'implementation': 'good_perf', 'rows': 20, 'seconds': 9.0}]
+        slower = benchmark_analyze.regressions(report, baseline, 1.5, ['good_perf'])
+        self.assertEqual(len(slower), 1)
+        self.assertTrue(slower[0].startswith('good_perf at 10 rows'))
+        self.assertEqual(benchmark_analyze.regressions(report, baseline, 2.5, ['good_perf']), [])
+
+
+if __name__ == '__main__':
+    unittest.main()